@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare two benchmark results written by ``run.py``.
+
+Usage: python3 benchmarks/compare.py OLD NEW
+"""
+
+import json
+import sys
+
+FIELDS = ["median", "parse", "peak_memory"]
+
+def main():
+    """Print changes between results given as arguments."""
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__.strip())
+    old, new = (json.load(open(x, "r")) for x in sys.argv[1:])
+    print("{} → {}".format(old["commit"], new["commit"]))
+    print("{:36s}".format("") + "".join(
+        "{:>20s}".format(x) for x in FIELDS))
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        a, b = old["results"][name], new["results"][name]
+        print("{:36s}".format(name) + "".join(
+            "{:>20s}".format("{:+.1f}%".format(
+                100 * (b[x] - a[x]) / a[x] if a[x] else 0))
+            for x in FIELDS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure provider calls against recorded responses.
+
+Usage: python3 benchmarks/run.py [--record] [--repeat N] [--output FILE]
+
+Cassettes of responses recorded in ``benchmarks/fixtures``, see
+:func:`pan.http.use_cassette`, are replayed from a local HTTP server,
+so that results measure Pan Transit, not the network. With ``--record``,
+query the live APIs instead and overwrite the fixtures.
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pan
+import server
+
+CASES = [
+    ("aseag", "find_departures", (["100001", "100002"],)),
+    ("aseag", "find_lines", (["100001", "100002"],)),
+    ("aseag", "find_nearby_stops", (6.091, 50.767)),
+    ("aseag", "find_stops", ("bushof", 6.091, 50.767)),
+    ("digitransit_hsl", "find_departures", (["HSL:1020447", "HSL:1020463"],)),
+    ("digitransit_hsl", "find_lines", (["HSL:1020447", "HSL:1020463"],)),
+    ("digitransit_hsl", "find_nearby_stops", (24.941, 60.169)),
+    ("digitransit_hsl", "find_stops", ("kamppi", 24.941, 60.169)),
+    ("tfl", "find_departures", (["940GZZLUESQ", "HUBEUS"],)),
+    ("tfl", "find_lines", (["940GZZLUESQ", "HUBEUS"],)),
+    ("tfl", "find_nearby_stops", (-0.139, 51.535)),
+    ("tfl", "find_stops", ("mornington", -0.139, 51.535)),
+]
+
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+class LocalConnectionPool(pan.http.ConnectionPool):
+
+    """A connection pool connecting to the local server for all hosts."""
+
+    def __init__(self, port):
+        """Initialize a :class:`LocalConnectionPool` instance."""
+        pan.http.ConnectionPool.__init__(self, 1)
+        self._port = port
+
+    def _new(self, url):
+        """Initialize and return a new HTTP connection to the local server."""
+        connection = http.client.HTTPConnection("127.0.0.1", self._port)
+        self._all_connections.add(connection)
+        return connection
+
+
+def call(provider, method, args):
+    """Call `method` of `provider` and return result."""
+    result = getattr(pan.Provider(provider), method)(*args)
+    # Provider methods return a blank list or an error dictionary
+    # on failure, which would make the measurements meaningless.
+    if not isinstance(result, list) or not result:
+        raise RuntimeError("{}.{} failed: {}"
+                           .format(provider, method, repr(result)))
+    return result
+
+def get_commit():
+    """Return the abbreviated hash of the current commit."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except Exception:
+        return "unknown"
+
+def measure(provider, method, args, repeat):
+    """Return a dictionary of measurements of calling `method`."""
+    # Warm up to load provider modules and establish connections.
+    call(provider, method, args)
+    metrics = pan.metrics.registry
+    totals, https = [], []
+    for i in range(repeat):
+        metrics.reset()
+        start = time.perf_counter()
+        call(provider, method, args)
+        totals.append(time.perf_counter() - start)
+        latency = metrics.snapshot()["histograms"].get("http.latency", {})
+        https.append(sum(x["sum"] for x in latency.values()))
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    call(provider, method, args)
+    retained = sys.getallocatedblocks() - blocks
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    parses = [x - y for x, y in zip(totals, https)]
+    return dict(http=statistics.median(https),
+                max=max(totals),
+                mean=statistics.mean(totals),
+                median=statistics.median(totals),
+                min=min(totals),
+                parse=statistics.median(parses),
+                peak_memory=peak,
+                retained_blocks=retained)
+
+def record():
+    """Query live APIs and write responses as fixtures."""
+    for provider in sorted(set(x[0] for x in CASES)):
+        path = os.path.join(FIXTURES_DIR, "{}.json".format(provider))
+        pan.http.use_cassette(path, "record")
+        for case in [x for x in CASES if x[0] == provider]:
+            print("Recording {}.{}...".format(*case[:2]))
+            call(*case)
+        pan.http.eject_cassette()
+
+def run(repeat, output):
+    """Measure all cases and write results to `output`."""
+    fixtures = server.FixtureServer(server.find_fixtures(FIXTURES_DIR))
+    fixtures.start()
+    pan.http.pool = LocalConnectionPool(fixtures.port)
+    results = {}
+    print("{:36s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+        "", "median", "http", "parse", "peak"))
+    for provider, method, args in CASES:
+        name = "{}.{}".format(provider, method)
+        result = results[name] = measure(provider, method, args, repeat)
+        print("{:36s} {:7.2f}ms {:7.2f}ms {:7.2f}ms {:7.0f}kB".format(
+            name,
+            1000 * result["median"],
+            1000 * result["http"],
+            1000 * result["parse"],
+            result["peak_memory"] / 1024))
+    pan.http.pool.terminate()
+    fixtures.stop()
+    commit = get_commit()
+    output = output or os.path.join(RESULTS_DIR, "{}.json".format(commit))
+    pan.util.write_json(dict(commit=commit,
+                             python=sys.version.split()[0],
+                             repeat=repeat,
+                             results=results,
+                             time=int(time.time())), output)
+
+    print("Results written to {}".format(output))
+
+def main():
+    """Parse arguments and run benchmarks."""
+    parser = argparse.ArgumentParser(description="Measure provider calls.")
+    parser.add_argument("--output", help="file to write results to")
+    parser.add_argument("--record", action="store_true",
+                        help="record fixtures from live APIs")
+    parser.add_argument("--repeat", type=int, default=50,
+                        help="times to call each method")
+    args = parser.parse_args()
+    if args.record:
+        return record()
+    run(args.repeat, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A local HTTP server replaying requests recorded in cassettes."""
+
+import http.server
+import os
+import pan
+import socketserver
+import threading
+import urllib.parse
+
+__all__ = ("FixtureServer", "find_fixtures")
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          http.server.HTTPServer):
+
+    """An HTTP server handling each request in a new thread."""
+
+    daemon_threads = True
+
+
+class FixtureServer:
+
+    """
+    A local HTTP server replaying requests recorded in cassettes.
+
+    Fixtures are cassettes as recorded by :func:`pan.http.use_cassette`
+    and responses are found as when replaying those, but are served over
+    HTTP without waiting for the recorded time taken.
+    """
+
+    def __init__(self, paths):
+        """Initialize a :class:`FixtureServer` instance."""
+        self._cassettes = {}
+        self._server = None
+        for path in paths:
+            cassette = pan.http.Cassette(path, "replay")
+            for request in cassette.requests:
+                # Requests arrive without scheme and host,
+                # map them back to recorded full URLs.
+                components = urllib.parse.urlparse(request["url"])
+                path = urllib.parse.urlunparse(("", "") + components[2:])
+                key = (request["method"], path)
+                self._cassettes[key] = (cassette, request["url"])
+
+    def find(self, method, path, body):
+        """Return recorded request best matching given request."""
+        if not (method, path) in self._cassettes: return None
+        cassette, url = self._cassettes[(method, path)]
+        request = cassette.find(method, url, body)
+        if pan.http.Cassette.decode(request, "body") != body:
+            # Matched only the closest body, so the request has changed
+            # since fixtures were made and results can be misleading.
+            pan.log.warning("No fixture with exact body for {} {}",
+                            method, url)
+        return request
+
+    @property
+    def port(self):
+        """Return the port the server is listening on."""
+        return self._server.server_address[1]
+
+    def start(self):
+        """Start serving in a background thread."""
+        server = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            # Avoid delays from Nagle's algorithm with keep-alive,
+            # since headers and body are written separately.
+            disable_nagle_algorithm = True
+            protocol_version = "HTTP/1.1"
+            def do_GET(self):
+                self.reply(server.find("GET", self.path, None))
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                self.reply(server.find("POST", self.path, body))
+            def log_message(self, *args): pass
+            def reply(self, request):
+                request = request or dict(status=404, response="")
+                blob = pan.http.Cassette.decode(request, "response")
+                self.send_response(request["status"])
+                self.send_header("Content-Length", str(len(blob)))
+                self.end_headers()
+                self.wfile.write(blob)
+        address = ("127.0.0.1", 0)
+        self._server = ThreadingHTTPServer(address, Handler)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is None: return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+
+
+def find_fixtures(directory=None):
+    """Return a list of paths of recorded fixture files."""
+    directory = directory or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    return sorted(os.path.join(directory, x)
+                  for x in os.listdir(directory)
+                  if x.endswith(".json"))
@@ -19,6 +19,9 @@
 
 __version__ = "1.2"
 
+from pan import startup
+startup.install()
+
 try:
     import pyotherside
 except ImportError:
@@ -36,10 +39,20 @@ from pan.paths import CONFIG_HOME_DIR
 from pan.paths import DATA_DIR
 from pan.paths import DATA_HOME_DIR
 from pan.paths import LOCALE_DIR
+from pan import log
 from pan import i18n
 from pan import util
+from pan import metrics
+from pan import profiler
+from pan import tracing
 from pan import http
+from pan import workers
 from pan.attrdict import AttrDict
+from pan.attrdict import AttrView
+from pan.records import Departure
+from pan.records import Line
+from pan.records import Record
+from pan.records import Stop
 from pan.provider import Provider
 from pan.favorites import Favorites
 from pan.history import History
@@ -49,21 +62,35 @@ from pan.application import Application
 
 assert Application
 assert AttrDict
+assert AttrView
 assert CACHE_HOME_DIR
 assert CONFIG_HOME_DIR
 assert ConfigurationStore
 assert DATA_DIR
 assert DATA_HOME_DIR
+assert Departure
 assert Favorites
 assert History
 assert http
 assert i18n
+assert Line
 assert LOCALE_DIR
+assert log
+assert metrics
+assert profiler
 assert Provider
+assert Record
+assert startup
+assert Stop
+assert tracing
 assert util
+assert workers
 
 def main():
     """Initialize application."""
-    conf.read()
+    with startup.phase("conf.read"):
+        conf.read()
     global app
-    app = Application()
+    with startup.phase("Application"):
+        app = Application()
+    startup.write()
@@ -19,8 +19,12 @@
 
 __all__ = ("Application",)
 
+import os
 import pan
-import sys
+import threading
+
+# Seconds to wait for further changes before writing files.
+SAVE_DELAY = 3
 
 
 class Application:
@@ -29,21 +33,54 @@ class Application:
 
     def __init__(self):
         """Initialize an :class:`Application` instance."""
-        self.favorites = pan.Favorites()
-        self.history = pan.History()
+        self._lock = threading.Lock()
+        self._save_timer = None
+        with pan.util.silent(KeyError):
+            pan.log.set_level(pan.conf.log_level)
+        if pan.conf.log_to_file:
+            pan.util.makedirs(pan.CACHE_HOME_DIR)
+            path = os.path.join(pan.CACHE_HOME_DIR, "pan-transit.log")
+            pan.log.set_file(path)
+        with pan.startup.phase("Favorites"):
+            self.favorites = pan.Favorites()
+        with pan.startup.phase("History"):
+            self.history = pan.History()
         self.provider = None
-        self.set_provider(pan.conf.provider)
+        with pan.startup.phase("set_provider"):
+            self.set_provider(pan.conf.provider)
+        if pan.conf.metrics_interval > 0:
+            pan.metrics.registry.start_dump(pan.conf.metrics_interval)
+        if pan.conf.profile:
+            pan.profiler.profiler.start()
+
+    def metrics(self):
+        """Return a dictionary of counters and latency histograms."""
+        return pan.metrics.registry.snapshot()
 
     def quit(self):
         """Quit the application."""
+        pan.workers.pool.terminate()
         pan.http.pool.terminate()
-        self.save()
+        self.write()
+        with pan.util.silent(Exception, tb=True):
+            pan.http.eject_cassette()
+        pan.tracing.write()
+        pan.profiler.profiler.stop()
+        pan.log.flush()
+        if pan.conf.metrics_interval > 0:
+            pan.metrics.registry.stop_dump()
+            pan.metrics.registry.write()
 
+    @pan.util.locked_method
     def save(self):
-        """Write configuration files."""
-        pan.conf.write()
-        self.favorites.write()
-        self.history.write()
+        """Write configuration files once changes have settled."""
+        # Coalesce saves called in quick succession, e.g. after each
+        # edit of a favorite, into a single write after a delay.
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+        self._save_timer = threading.Timer(SAVE_DELAY, self.write)
+        self._save_timer.daemon = True
+        self._save_timer.start()
 
     def set_provider(self, provider):
         """Set provider from string `provider`."""
@@ -51,10 +88,35 @@ class Application:
             self.provider = pan.Provider(provider)
             pan.conf.provider = provider
         except Exception as error:
-            print("Failed to load provider '{}': {}"
-                  .format(provider, str(error)),
-                  file=sys.stderr)
+            pan.log.error("Failed to load provider '{}': {}",
+                          provider, str(error))
             if self.provider is None:
                 default = pan.conf.get_default("provider")
                 if default != provider:
                     self.set_provider(default)
+
+    def start_profiling(self):
+        """Start sampling stacks of threads."""
+        pan.profiler.profiler.start()
+
+    def start_tracing(self):
+        """Start tracing spans of calls."""
+        pan.tracing.start()
+
+    def stop_profiling(self):
+        """Stop sampling stacks of threads and write samples."""
+        pan.profiler.profiler.stop()
+
+    def stop_tracing(self):
+        """Stop tracing spans of calls and write traced events."""
+        pan.tracing.stop()
+
+    @pan.util.locked_method
+    def write(self):
+        """Write changed configuration files immediately."""
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        pan.conf.write()
+        self.favorites.write()
+        self.history.write()
@@ -22,7 +22,7 @@
 
 """Dictionary with attribute access to keys."""
 
-__all__ = ("AttrDict",)
+__all__ = ("AttrDict", "AttrView")
 
 
 class AttrDict(dict):
@@ -79,3 +79,67 @@ class AttrDict(dict):
         """Update dictionary with key-value pairs from arguments."""
         other = AttrDict(*args, **kwargs)
         return dict.update(self, other)
+
+
+class AttrView:
+
+    """
+    Read-only view of nested dictionaries and lists with attribute access.
+
+    Unlike :class:`AttrDict`, which recursively copies all nested containers
+    at initialization, nested containers are wrapped only when accessed.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        """Initialize a view of :class:`dict` or :class:`list` `data`."""
+        object.__setattr__(self, "_data", data)
+
+    def __bool__(self):
+        """Return ``True`` if data is not empty."""
+        return bool(self._data)
+
+    def __contains__(self, item):
+        """Return ``True`` if data contains `item`."""
+        return item in self._data
+
+    def __getattr__(self, name):
+        """Return `name` from dictionary data."""
+        try:
+            return self.__wrap(self._data[name])
+        except (KeyError, TypeError) as error:
+            raise AttributeError(str(error))
+
+    def __getitem__(self, key):
+        """Return `key` from data."""
+        return self.__wrap(self._data[key])
+
+    def __iter__(self):
+        """Return an iterator over keys or items of data."""
+        if isinstance(self._data, dict):
+            return iter(self._data)
+        return map(self.__wrap, self._data)
+
+    def __len__(self):
+        """Return the length of data."""
+        return len(self._data)
+
+    def __repr__(self):
+        """Return a string representation of view."""
+        return "AttrView({})".format(repr(self._data))
+
+    def __setattr__(self, name, value):
+        """Raise :exc:`AttributeError`, views are read-only."""
+        raise AttributeError("Cannot set {}, AttrView is read-only"
+                             .format(repr(name)))
+
+    def __wrap(self, value):
+        """Return `value` with containers wrapped as views."""
+        if isinstance(value, (dict, list)):
+            return AttrView(value)
+        return value
+
+    def get(self, key, default=None):
+        """Return `key` from dictionary data or `default`."""
+        return self.__wrap(self._data.get(key, default))
@@ -20,13 +20,24 @@
 import copy
 import os
 import pan
-import sys
 
 __all__ = ("ConfigurationStore",)
 
 DEFAULTS = {
+    # Maximum amount of departures to show, zero for no limit.
+    "departure_limit": 50,
     "departure_time_cutoff": 10,
+    # Seconds from now to show departures for, zero for no limit.
+    "departure_window": 0,
     "favorite_highlight_radius": 1000,
+    # Level of messages to log: debug, info, warning or error.
+    "log_level": "info",
+    # Log also to a file under pan.CACHE_HOME_DIR.
+    "log_to_file": False,
+    # Seconds between writing metrics to file, zero to not write.
+    "metrics_interval": 0,
+    # Sample stacks of threads, see pan.profiler.
+    "profile": False,
     "provider": "digitransit_hsl",
     "units": "metric",
 }
@@ -39,6 +50,8 @@ class ConfigurationStore(pan.AttrDict):
     def __init__(self):
         """Initialize a :class:`Configuration` instance."""
         pan.AttrDict.__init__(self, copy.deepcopy(DEFAULTS))
+        # Bypass AttrDict.__setattr__ to not store this as an option.
+        object.__setattr__(self, "_written", None)
 
     def add(self, option, item):
         """Add `item` to the value of `option`."""
@@ -124,19 +137,21 @@ class ConfigurationStore(pan.AttrDict):
                 root[name] = copy.deepcopy(value)
             except Exception as error:
                 full_name = ".".join(path + (name,))
-                print("Discarding bad option-value pair {}, {}: {}"
-                      .format(repr(full_name), repr(value), str(error)),
-                      file=sys.stderr)
+                pan.log.warning("Discarding bad option-value pair {}, {}: {}",
+                                repr(full_name), repr(value), str(error))
 
     def write(self, path=None):
         """Write values of options to JSON file at `path`."""
         path = path or os.path.join(pan.CONFIG_HOME_DIR, "pan-transit.json")
-        out = copy.deepcopy(self)
+        out = copy.deepcopy(dict(self))
         # Make sure no obsolete top-level options remain.
         names = list(DEFAULTS.keys())
         for name in list(out.keys()):
             if not name in names:
                 del out[name]
         out["version"] = pan.__version__
+        # Avoid rewriting the file if nothing has changed.
+        if (path, out) == self._written: return
         with pan.util.silent(Exception, tb=True):
             pan.util.write_json(out, path)
+            object.__setattr__(self, "_written", (path, out))
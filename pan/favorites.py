@@ -17,11 +17,11 @@
 
 """A collection of favorite stop groups and their metadata."""
 
+import collections
 import copy
 import json
 import os
 import pan
-import sys
 import threading
 import time
 import uuid
@@ -33,24 +33,31 @@ class Favorites:
 
     """A collection of favorite stop groups and their metadata."""
 
-    def __init__(self):
+    def __init__(self, path=None):
         """Initialize a :class:`Favorites` instance."""
-        self._favorites = []
-        self._path = os.path.join(pan.CONFIG_HOME_DIR, "favorites.json")
+        self._cache = {}
+        self._favorites = collections.OrderedDict()
+        self._generations = collections.Counter()
+        self._lock = threading.RLock()
+        self._path = path or os.path.join(
+            pan.CONFIG_HOME_DIR, "favorites.json")
+        self._written = None
         self._read()
 
+    @pan.util.locked_method
     def add(self, name):
         """Add `name` as a new favorite and return key."""
         key = str(uuid.uuid4())
-        self._favorites.append(pan.AttrDict(key=key,
+        self._favorites[key] = pan.AttrDict(key=key,
                                             provider=pan.conf.provider,
                                             name=name,
                                             stops=[],
-                                            ignore_lines=[]))
+                                            ignore_lines=[])
 
         self._update_meta(key)
         return key
 
+    @pan.util.locked_method
     def add_stop(self, key, props):
         """Add stop to favorite `key`."""
         favorite = self.get(key)
@@ -65,52 +72,83 @@ class Favorites:
         self._update_meta(key)
 
     @property
+    @pan.util.locked_method
     def favorites(self):
         """Return a list of favorite stop groups of the current provider."""
-        favorites = copy.deepcopy(self._favorites)
-        favorites = [x for x in favorites if x.provider == pan.conf.provider]
-        favorites.sort(key=lambda x: x.name)
-        for favorite in favorites:
-            favorite.stops = self.get_stops(favorite.key)
-            favorite.color = self.get_color(favorite.key)
-            favorite.line_summary = self.get_line_summary(favorite.key)
-        return favorites
-
-    def find_departures(self, key):
+        # Return shallow copies with derived fields added. Nested values
+        # are shared and must be treated as read-only, which is fine for
+        # passing to QML as PyOtherSide converts them anyway.
+        favorites = [x for x in self._favorites.values() if
+                     x.provider == pan.conf.provider]
+        favorites = sorted(favorites, key=lambda x: x.name)
+        return [dict(x,
+                     color=self.get_color(x.key),
+                     line_summary=self.get_line_summary(x.key),
+                     stops=self._get_sorted_stops(x.key))
+                for x in favorites]
+
+    @pan.tracing.traced("favorites")
+    def find_departures(self, key, diff=False, page=None):
         """Return a list of departures from favorite `key`."""
         provider = self.get_provider(key)
         if provider is None: return []
         stops = self.get_stop_ids(key)
-        ignores = self.get_ignore_lines(key)
-        return provider.find_departures(stops, ignores)
+        ignores = self.get_ignore_set(key)
+        return provider.find_departures(stops, ignores, diff, page)
 
     def get(self, key):
         """Return favorite `key` or raise :exc:`LookupError`."""
-        for favorite in self._favorites:
-            if favorite.key == key:
-                return favorite
-        raise LookupError("Favorite {} not found"
-                          .format(repr(key)))
+        try:
+            return self._favorites[key]
+        except KeyError:
+            raise LookupError("Favorite {} not found"
+                              .format(repr(key)))
+
+    def _get_cached(self, key, name, function):
+        """Return `name` derived by calling `function` on favorite `key`."""
+        # Derived values are cached until favorite `key` is changed,
+        # see _invalidate, which all mutating methods must call.
+        # Read cache of key once, since it can be dropped
+        # meanwhile by _invalidate from a worker thread.
+        cache = self._cache.get(key, {})
+        if name in cache:
+            pan.metrics.registry.count("cache.hits", "favorites")
+            return cache[name]
+        pan.metrics.registry.count("cache.misses", "favorites")
+        generation = self._generations[key]
+        value = function(self.get(key))
+        with self._lock:
+            # Don't store if invalidated while computing, e.g. from
+            # _update_lines in a worker thread, as value can be stale.
+            if self._generations[key] == generation:
+                self._cache.setdefault(key, {})[name] = value
+        return value
 
     def get_color(self, key):
         """Return color to use for favorite `key`."""
-        favorite = self.get(key)
-        colors = [x.color for x in favorite.stops]
-        return pan.util.most_common(colors)
+        return self._get_cached(key, "color", lambda favorite:
+                                pan.util.most_common([
+                                    x.color for x in favorite.stops]))
 
     def get_ignore_lines(self, key):
         """Return a list of lines to not be displayed."""
         favorite = self.get(key)
         return copy.deepcopy(favorite.ignore_lines)
 
+    def get_ignore_set(self, key):
+        """Return a set of normalized lines to not be displayed."""
+        return self._get_cached(key, "ignore_set", lambda favorite:
+                                pan.util.compile_ignores(
+                                    favorite.ignore_lines))
+
     def get_line_summary(self, key):
         """Return a string listing lines of favorite `key`."""
-        favorite = self.get(key)
-        lines = favorite.get("lines", [])
-        for line in lines:
-            line.destination = ""
-        lines = pan.util.sorted_unique_lines(lines)
-        return ", ".join(x.name for x in lines)
+        def summarize(favorite):
+            lines = favorite.get("lines", [])
+            lines = [dict(name=x.name, destination="") for x in lines]
+            lines = pan.util.sorted_unique_lines(lines)
+            return ", ".join(x["name"] for x in lines)
+        return self._get_cached(key, "line_summary", summarize)
 
     def get_name(self, key):
         """Return name of favorite `key`."""
@@ -123,36 +161,48 @@ class Favorites:
         try:
             return pan.Provider(favorite.provider)
         except Exception as error:
-            print("Failed to load provider '{}': {}"
-                  .format(favorite.provider, str(error)),
-                  file=sys.stderr)
+            pan.log.error("Failed to load provider '{}': {}",
+                          favorite.provider, str(error))
             return None
 
     def get_stop_ids(self, key):
         """Return a list of stop ids of favorite `key`."""
-        return [x.id for x in self.get_stops(key)]
+        return [x.id for x in self._get_sorted_stops(key)]
+
+    def _get_sorted_stops(self, key):
+        """Return a cached, read-only list of stops of favorite `key`."""
+        return self._get_cached(key, "stops", lambda favorite:
+                                sorted(favorite.stops,
+                                       key=lambda x: x.name))
 
     def get_stops(self, key):
         """Return a list of stops of favorite `key`."""
-        favorite = self.get(key)
-        stops = copy.deepcopy(favorite.stops)
-        return sorted(stops, key=lambda x: x.name)
+        return copy.deepcopy(self._get_sorted_stops(key))
+
+    def _invalidate(self, key):
+        """Clear cached derived values of favorite `key`."""
+        with self._lock:
+            self._generations[key] += 1
+            self._cache.pop(key, None)
 
     def _read(self):
         """Read list of favorites from file."""
         with pan.util.silent(Exception, tb=True):
             if os.path.isfile(self._path):
-                self._favorites = list(map(
-                    pan.AttrDict,
-                    pan.util.read_json(self._path)))
+                self._written = pan.util.read_json(self._path)
+                self._favorites = collections.OrderedDict(
+                    (x["key"], pan.AttrDict(x)) for x in
+                    copy.deepcopy(self._written))
                 self._validate()
                 self._update_meta()
 
+    @pan.util.locked_method
     def remove(self, key):
         """Remove favorite `key` from the list of favorites."""
-        keep = lambda x: x.key != key
-        self._favorites = list(filter(keep, self._favorites))
+        self._favorites.pop(key, None)
+        self._invalidate(key)
 
+    @pan.util.locked_method
     def remove_stop(self, key, id):
         """Remove `id` from stops of favorite `key`."""
         favorite = self.get(key)
@@ -160,11 +210,13 @@ class Favorites:
         favorite.stops = list(filter(keep, favorite.stops))
         self._update_meta(key)
 
+    @pan.util.locked_method
     def rename(self, key, name):
         """Give favorite `key` a new name."""
         favorite = self.get(key)
         favorite.name = name.strip()
 
+    @pan.util.locked_method
     def set_ignore_lines(self, key, ignore):
         """Set list of lines to not be displayed."""
         favorite = self.get(key)
@@ -186,17 +238,24 @@ class Favorites:
     def _update_lines(self, key, provider):
         """Update list of lines using stops of favorite `key`."""
         with pan.util.silent(Exception, tb=True):
-            favorite = self.get(key)
-            stops = self.get_stop_ids(key)
+            with self._lock:
+                # Favorite can have been removed while queued.
+                if not key in self._favorites: return
+                stops = self.get_stop_ids(key)
             lines = provider.find_lines(stops)
             if not isinstance(lines, list):
                 # Likely due to a timeout, see util.api_query.
                 raise TypeError("Bad value for lines: {}"
                                 .format(json.dumps(lines)))
 
-            ignores = self.get_ignore_lines(key)
-            lines = pan.util.filter_lines(lines, ignores)
-            favorite.lines = list(filter(None, lines))
+            with self._lock:
+                # Or while finding lines.
+                if not key in self._favorites: return
+                favorite = self.get(key)
+                ignores = self.get_ignore_set(key)
+                lines = pan.util.filter_lines(lines, ignores)
+                favorite.lines = [pan.AttrDict(x) for x in lines if x]
+                self._invalidate(key)
 
     def _update_meta(self, *keys):
         """Update metadata, forcing update of favorites `keys`."""
@@ -204,17 +263,23 @@ class Favorites:
             # Force update by marking as old.
             favorite = self.get(key)
             favorite.updated = -1
-        for favorite in self._favorites:
-            self._update_coordinates(favorite.key)
+            self._invalidate(key)
+        for favorite in self._favorites.values():
+            if not keys or favorite.key in keys:
+                self._update_coordinates(favorite.key)
             # Make sure the first instantiation of a singleton
             # provider happens in the main thread.
             provider = self.get_provider(favorite.key)
             provider.store_stops(favorite.stops)
             if time.time() - favorite.get("updated", -1) > 7 * 86400:
                 favorite.updated = int(time.time())
-                threading.Thread(target=self._update_lines,
-                                 args=[favorite.key, provider],
-                                 daemon=True).start()
+                # Update favorites of the current provider first,
+                # since those are the ones visible to the user.
+                priority = int(favorite.provider != pan.conf.provider)
+                pan.workers.pool.put(self._update_lines,
+                                     favorite.key,
+                                     provider,
+                                     priority=priority)
 
     def _validate(self):
         """Drop invalid entries in favorites."""
@@ -222,27 +287,33 @@ class Favorites:
         # and we fail to handle that correctly. Possible issues are likely
         # to be related to fields updated after the favorite creation, either
         # automatically (see _update_lines) or by the user.
-        for favorite in self._favorites:
+        for favorite in self._favorites.values():
             self._validate_field(favorite, "ignore_lines", list, [], dict)
             self._validate_field(favorite, "lines", list, [], dict)
             self._validate_field(favorite, "stops", list, [], dict)
 
     def _validate_field(self, values, key, value_type, default, child_type=None):
         """Set `key` in `values` to `default` if invalid."""
+        # Fields updated after creation can be missing.
+        values.setdefault(key, default)
         if not isinstance(values[key], value_type):
-            print("Discarding bad value for '{}': {}"
-                  .format(key, repr(values[key])),
-                  file=sys.stderr)
+            pan.log.warning("Discarding bad value for '{}': {}",
+                            key, repr(values[key]))
             values[key] = default
         if child_type is None: return
         for i in reversed(range(len(values[key]))):
             if not isinstance(values[key][i], child_type):
-                print("Discarding bad child under '{}': {}"
-                      .format(key, json.dumps(values[key][i])),
-                      file=sys.stderr)
+                pan.log.warning("Discarding bad child under '{}': {}",
+                                key, json.dumps(values[key][i]))
                 del values[key][i]
 
     def write(self):
-        """Write list of favorites to file."""
+        """Write list of favorites to file if changed."""
         with pan.util.silent(Exception, tb=True):
-            pan.util.write_json(self._favorites, self._path)
+            # Writes are run from a timer thread, see Application.save,
+            # so take a copy to not be changed while writing.
+            with self._lock:
+                favorites = copy.deepcopy(list(self._favorites.values()))
+            if favorites == self._written: return
+            pan.util.write_json(favorites, self._path, compact=True)
+            self._written = favorites
@@ -17,47 +17,193 @@
 
 """Managing a history of search queries."""
 
+import bisect
+import collections
+import itertools
+import json
 import os
 import pan
+import threading
 
 __all__ = ("History",)
 
+# Maximum amount of queries to keep.
+MAX_QUERIES = 1000
+
+# Amount of journal entries after which to compact.
+MAX_JOURNAL = 100
+
 
 class History:
 
-    """Managing a history of search queries."""
+    """
+    Managing a history of search queries.
 
-    def __init__(self):
+    Queries are stored as a JSON snapshot of queries and their use counts
+    and an append-only journal of additions and removals since the snapshot.
+    Writing appends to the journal and only rewrites the snapshot once the
+    journal grows long.
+    """
+
+    def __init__(self, path=None):
         """Initialize a :class:`History` instance."""
-        self._queries = []
-        self._path = os.path.join(pan.CONFIG_HOME_DIR, "search-history.json")
+        self._path = path or os.path.join(
+            pan.CONFIG_HOME_DIR, "search-history.json")
+        self._journal_path = "{}.journal".format(
+            os.path.splitext(self._path)[0])
+        self._journal_size = 0
+        self._lock = threading.RLock()
+        self._pending = []
+        # Map casefolded queries to queries, most recent last.
+        self._queries = collections.OrderedDict()
+        # Sorted casefolded queries for prefix lookups and sorted
+        # pairs of suffixes of casefolded queries and casefolded
+        # queries for lookups of matches later in queries. Built
+        # on first use to keep reading queries at startup fast.
+        self._index = None
+        self._suffixes = None
+        # Map casefolded queries to use counts and times of last use
+        # as a running number, used to rank suggestions.
+        self._counts = collections.Counter()
+        self._stamps = {}
+        self._stamp = itertools.count()
         self._read()
 
+    @pan.util.locked_method
     def add(self, query):
         """Add `query` to the list of queries."""
         query = query.strip()
         if not query: return
-        self.remove(query)
-        self._queries.insert(0, query)
+        self._add(query)
+        self._pending.append(["add", query])
+
+    def _add(self, query, count=1):
+        """Add `query` to the list of queries without journaling."""
+        key = query.casefold()
+        if (self._queries.pop(key, None) is None and
+            self._index is not None):
+            bisect.insort(self._index, key)
+            for suffix in self._get_suffixes(key):
+                bisect.insort(self._suffixes, suffix)
+        self._queries[key] = query
+        self._counts[key] += count
+        self._stamps[key] = next(self._stamp)
+
+    def _build_index(self):
+        """Build indexes for lookups of queries if not yet built."""
+        if self._index is not None: return
+        self._index = sorted(self._queries)
+        self._suffixes = sorted(itertools.chain.from_iterable(
+            map(self._get_suffixes, self._queries)))
+
+    def _compact(self):
+        """Write all queries to snapshot and clear the journal."""
+        # Write counts too, so that ranking survives compaction.
+        pan.util.write_json([[x, self._counts[x.casefold()]]
+                             for x in self.queries[:MAX_QUERIES]],
+                            self._path,
+                            compact=True)
+
+        with pan.util.silent(FileNotFoundError):
+            os.remove(self._journal_path)
+        self._journal_size = 0
+
+    def _get_suffixes(self, key):
+        """Return pairs of suffixes of `key` and `key` for lookups."""
+        return [(key[i:], key) for i in range(1, len(key))]
 
     @property
+    @pan.util.locked_method
     def queries(self):
-        """Return a list of queries."""
-        return self._queries[:]
+        """Return a list of queries, most recent first."""
+        return list(reversed(self._queries.values()))
 
     def _read(self):
-        """Read list of queries from file."""
+        """Read list of queries from snapshot and journal files."""
         with pan.util.silent(Exception, tb=True):
             if os.path.isfile(self._path):
-                self._queries = pan.util.read_json(self._path)
+                for item in reversed(pan.util.read_json(self._path)):
+                    # Snapshots written before counts contain
+                    # only queries, use count of one for those.
+                    if isinstance(item, str): item = [item, 1]
+                    self._add(*item)
+        with pan.util.silent(Exception, tb=True):
+            if os.path.isfile(self._journal_path):
+                with open(self._journal_path, "r", encoding="utf_8") as f:
+                    for line in f:
+                        # Skip a possibly truncated last line.
+                        with pan.util.silent(ValueError):
+                            action, query = json.loads(line)
+                            self._journal_size += 1
+                            if action == "add": self._add(query)
+                            if action == "remove": self._remove(query)
 
+    @pan.util.locked_method
     def remove(self, query):
         """Remove `query` from the list of queries."""
-        query = query.strip().lower()
-        keep = lambda x: x.lower() != query
-        self._queries = list(filter(keep, self._queries))
+        query = query.strip()
+        self._remove(query)
+        self._pending.append(["remove", query])
+
+    def _remove(self, query):
+        """Remove `query` from the list of queries without journaling."""
+        key = query.casefold()
+        if self._queries.pop(key, None) is None: return
+        self._counts.pop(key, None)
+        self._stamps.pop(key, None)
+        if self._index is None: return
+        del self._index[bisect.bisect_left(self._index, key)]
+        for suffix in self._get_suffixes(key):
+            del self._suffixes[bisect.bisect_left(self._suffixes, suffix)]
+
+    @pan.util.locked_method
+    def suggest(self, text, limit=10):
+        """
+        Return up to `limit` queries matching `text`, best first.
+
+        Queries starting with `text` are returned first, followed by queries
+        containing `text` elsewhere. Within both, queries used more often
+        rank first, ties broken by recency. If `text` is blank, return the
+        most recent queries.
+        """
+        text = text.strip().casefold()
+        if not text: return self.queries[:limit]
+        self._build_index()
+        rank = lambda x: (-self._counts[x], -self._stamps[x])
+        found = []
+        for key in itertools.islice(self._index,
+                                    bisect.bisect_left(self._index, text),
+                                    None):
+            if not key.startswith(text): break
+            found.append(key)
+        found.sort(key=rank)
+        if len(found) < limit:
+            # Look up matches later in queries from suffixes.
+            later = set()
+            for suffix, key in itertools.islice(
+                    self._suffixes,
+                    bisect.bisect_left(self._suffixes, (text,)),
+                    None):
+                if not suffix.startswith(text): break
+                if key.startswith(text): continue
+                later.add(key)
+            found.extend(sorted(later, key=rank))
+        return [self._queries[x] for x in found[:limit]]
 
+    @pan.util.locked_method
     def write(self):
-        """Write list of queries to file."""
+        """Write changes to the list of queries to file."""
+        # Run from a timer thread, see Application.save, so
+        # locked to not change queries while iterating.
+        if not self._pending: return
+        pending, self._pending = self._pending, []
         with pan.util.silent(Exception, tb=True):
-            pan.util.write_json(self._queries[:1000], self._path)
+            if self._journal_size + len(pending) > MAX_JOURNAL:
+                while len(self._queries) > MAX_QUERIES:
+                    self._remove(next(iter(self._queries)))
+                return self._compact()
+            pan.util.makedirs(os.path.dirname(self._journal_path))
+            with open(self._journal_path, "a", encoding="utf_8") as f:
+                for item in pending:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._journal_size += len(pending)
@@ -17,13 +17,15 @@
 
 """Managed persistent HTTP connections."""
 
+import base64
+import difflib
 import http.client
 import json
 import pan
 import queue
 import re
-import sys
 import threading
+import time
 import urllib.parse
 
 BROKEN_CONNECTION_ERRORS = [
@@ -40,6 +42,104 @@ HEADERS = {
 RE_LOCALHOST = re.compile(r"://(127.0.0.1|localhost)\b")
 
 
+class Cassette:
+
+    """
+    Recorded HTTP requests and responses.
+
+    In record mode, requests made are stored with their responses and the time
+    taken. In replay mode, requests are answered from those stored instead of
+    the network, after waiting for the time taken multiplied by `scale`.
+    """
+
+    def __init__(self, path, mode="replay", scale=1):
+        """Initialize a :class:`Cassette` instance."""
+        if not mode in ("record", "replay"):
+            raise ValueError("Bad mode: {}".format(repr(mode)))
+        self._lock = threading.Lock()
+        self._played = {}
+        self.mode = mode
+        self.path = path
+        self.requests = []
+        self.scale = scale
+        if mode == "replay":
+            self.requests = pan.util.read_json(path)["requests"]
+
+    @pan.util.locked_method
+    def add(self, method, url, body, status, blob, duration):
+        """Add request and response to recorded requests."""
+        request = dict(duration=duration,
+                       method=method,
+                       status=status,
+                       url=url)
+
+        request.update(self.encode("body", body))
+        request.update(self.encode("response", blob))
+        self.requests.append(request)
+
+    @staticmethod
+    def decode(request, name):
+        """Return field `name` of recorded `request` as bytes."""
+        if "{}_base64".format(name) in request:
+            return base64.b64decode(request["{}_base64".format(name)])
+        value = request.get(name, None)
+        if value is None: return None
+        return value.encode("utf_8")
+
+    @staticmethod
+    def encode(name, blob):
+        """Return a dictionary of field `name` holding `blob`."""
+        if isinstance(blob, bytes):
+            # Keep text readable in files, but fall back on Base64
+            # for bytes that aren't UTF-8, which JSON can't hold.
+            try:
+                blob = blob.decode("utf_8")
+            except UnicodeDecodeError:
+                blob = base64.b64encode(blob).decode("ascii")
+                return {"{}_base64".format(name): blob}
+        return {name: blob}
+
+    @pan.util.locked_method
+    def find(self, method, url, body):
+        """Return recorded request best matching given request."""
+        if isinstance(body, str):
+            body = body.encode("utf_8")
+        candidates = [x for x in self.requests
+                      if x["method"] == method and x["url"] == url]
+        if not candidates:
+            raise Exception("No recorded response for {} {}"
+                            .format(method, url))
+        matches = [x for x in candidates if self.decode(x, "body") == body]
+        if not matches:
+            # Bodies can contain varying parts, e.g. the current time,
+            # so fall back on the closest instead of an exact match.
+            matches = [max(candidates, key=lambda x: difflib.SequenceMatcher(
+                None, self.decode(x, "body") or b"", body or b"").ratio())]
+        # Cycle through responses recorded for the same request,
+        # e.g. for successive refreshes of departures.
+        key = (method, url, self.decode(matches[0], "body"))
+        i = self._played.get(key, 0)
+        self._played[key] = i + 1
+        return matches[i % len(matches)]
+
+    def play(self, method, url, body):
+        """Return response blob to given request after a delay."""
+        request = self.find(method, url, body)
+        time.sleep(request["duration"] * self.scale)
+        if not 200 <= request["status"] <= 299:
+            raise Exception("Server responded {}".format(
+                repr(request["status"])))
+        return self.decode(request, "response")
+
+    def write(self):
+        """Write recorded requests to file."""
+        if self.mode != "record": return
+        pan.util.write_json(dict(requests=self.requests), self.path)
+
+
+cassette = None
+
+
 class ConnectionPool:
 
     """A managed pool of persistent per-host HTTP connections."""
@@ -90,7 +190,7 @@ class ConnectionPool:
     def _new(self, url):
         """Initialize and return a new HTTP connection to `url`."""
         components = urllib.parse.urlparse(url)
-        print("Establishing connection to {}".format(components.netloc))
+        pan.log.debug("Establishing connection to {}", components.netloc)
         cls = {
             "http":  http.client.HTTPConnection,
             "https": http.client.HTTPSConnection,
@@ -133,6 +233,13 @@ class ConnectionPool:
 pool = ConnectionPool(1)
 
 
+def eject_cassette():
+    """Stop recording or replaying and write recorded requests."""
+    global cassette
+    if cassette is None: return
+    cassette.write()
+    cassette = None
+
 def get(url, encoding=None, retry=1, headers=None):
     """Make a HTTP GET request at `url` and return response."""
     return _request("GET",
@@ -181,12 +288,26 @@ def _request(method, url, body=None, encoding=None, retry=1, headers=None):
     that imply a connection error. `headers` should be a dictionary of custom
     headers to add to the defaults :attr:`http.HEADERS`.
     """
-    print("{} {}".format(method, url))
+    pan.log.debug("{} {}", method, url)
+    with pan.tracing.span(method, "http", url=url):
+        return _request_raw(method, url, body, encoding, retry, headers)
+
+def _request_raw(method, url, body=None, encoding=None, retry=1, headers=None):
+    """Make a HTTP request at `url` using `method`, see :func:`_request`."""
+    metrics = pan.metrics.registry
+    components = urllib.parse.urlparse(url)
+    host = components.netloc
+    if cassette is not None and cassette.mode == "replay":
+        with metrics.timed("http.latency", host):
+            blob = cassette.play(method, url, body)
+        if encoding is None: return blob
+        return blob.decode(encoding, errors="replace")
     try:
-        connection = pool.get(url)
+        with metrics.timed("http.pool_wait", host):
+            connection = pool.get(url)
+        start = time.perf_counter()
         # Do relative requests (without scheme and netloc)
         # for better compatibility with different servers.
-        components = urllib.parse.urlparse(url)
         components = ("", "") + components[2:]
         path = urllib.parse.urlunparse(components)
         headall = HEADERS.copy()
@@ -200,6 +321,13 @@ def _request(method, url, body=None, encoding=None, retry=1, headers=None):
         # Always read response to avoid
         # http.client.ResponseNotReady: Request-sent.
         blob = response.read()
+        duration = time.perf_counter() - start
+        if cassette is not None and cassette.mode == "record":
+            cassette.add(method, url, body, response.status, blob, duration)
+        metrics.observe("http.latency", host, duration)
+        metrics.count("http.bytes_in", host, len(blob))
+        metrics.count("http.bytes_out", host, len(body or b""))
+        metrics.count("http.requests", host)
         if not 200 <= response.status <= 299:
             raise Exception("Server responded {}: {}".format(
                 repr(response.status), repr(response.reason)))
@@ -211,17 +339,29 @@ def _request(method, url, body=None, encoding=None, retry=1, headers=None):
         connection = None
         broken = tuple(BROKEN_CONNECTION_ERRORS)
         if not isinstance(error, broken) or retry == 0:
+            metrics.count("http.errors", host)
             name = error.__class__.__name__
-            print("{} failed: {}: {}"
-                  .format(method, name, str(error)),
-                  file=sys.stderr)
+            pan.log.error("{} failed: {}: {}", method, name, str(error))
             raise # Exception
         # If we haven't successfully returned a response,
         # nor reraised an Exception, we move on to try again.
         assert retry > 0
+        metrics.count("http.retries", host)
     finally:
         pool.put(url, connection)
-    return _request(method, url, body, encoding, retry-1, headers)
+    return _request_raw(method, url, body, encoding, retry-1, headers)
+
+def use_cassette(path, mode="replay", scale=1):
+    """
+    Start recording requests to or replaying requests from `path`.
+
+    `mode` should be either "record" or "replay". When replaying, wait for
+    the recorded time taken multiplied by `scale`, e.g. zero to not wait at
+    all. Use :func:`eject_cassette` to stop and write recorded requests.
+    """
+    global cassette
+    eject_cassette()
+    cassette = Cassette(path, mode, scale)
 
 def _request_json(method, url, body=None, encoding="utf_8", retry=1, headers=None):
     """
@@ -246,7 +386,5 @@ def _request_json(method, url, body=None, encoding="utf_8", retry=1, headers=Non
         return json.loads(text)
     except Exception as error:
         name = error.__class__.__name__
-        print("Failed to parse JSON data: {}: {}"
-              .format(name, str(error)),
-              file=sys.stderr)
+        pan.log.error("Failed to parse JSON data: {}: {}", name, str(error))
         raise # Exception
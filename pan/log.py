@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Leveled logging without blocking the caller.
+
+Messages are formatted only if at or above the current level and kept in
+a ring buffer of recent messages. A background thread writes them to
+standard error and, optionally, a file, so that callers, e.g. each HTTP
+request, don't wait for slow synchronous output under PyOtherSide.
+"""
+
+import atexit
+import collections
+import sys
+import threading
+import time
+import traceback
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR,
+}
+
+NAMES = {v: k.upper() for k, v in LEVELS.items()}
+
+# Maximum amount of recent messages to keep.
+MAX_RECORDS = 1000
+
+level = INFO
+
+_file = None
+_lock = threading.Lock()
+_pending = collections.deque(maxlen=MAX_RECORDS)
+_records = collections.deque(maxlen=MAX_RECORDS)
+_wake = threading.Event()
+_writer = None
+
+
+def debug(message, *args):
+    """Log `message` formatted with `args` at debug level."""
+    if level <= DEBUG:
+        _log(DEBUG, message, args)
+
+def error(message, *args):
+    """Log `message` formatted with `args` at error level."""
+    if level <= ERROR:
+        _log(ERROR, message, args)
+
+def exception(message, *args):
+    """Log `message` and traceback of current exception at error level."""
+    if level <= ERROR:
+        if args: message = message.format(*args)
+        message = "\n".join((message, traceback.format_exc().rstrip()))
+        _log(ERROR, message, ())
+
+def flush():
+    """Write pending messages immediately."""
+    with _lock:
+        while _pending:
+            line = _pending.popleft()
+            print(line, file=sys.stderr)
+            if _file is not None:
+                _file.write(line + "\n")
+        if _file is not None:
+            _file.flush()
+
+def info(message, *args):
+    """Log `message` formatted with `args` at info level."""
+    if level <= INFO:
+        _log(INFO, message, args)
+
+def _log(lvl, message, args):
+    """Add `message` to be written in the background."""
+    if args:
+        message = message.format(*args)
+    line = "{} {}: {}".format(time.strftime("%H:%M:%S"), NAMES[lvl], message)
+    # Appending to a deque is thread-safe and doesn't block,
+    # unlike writing to a stream, which is left for the writer.
+    _records.append(line)
+    _pending.append(line)
+    _start_writer()
+    _wake.set()
+
+def records():
+    """Return a list of recent messages."""
+    return list(_records)
+
+def set_file(path):
+    """Write messages also to file at `path`, ``None`` to not write."""
+    global _file
+    flush()
+    with _lock:
+        if _file is not None:
+            _file.close()
+        _file = None
+        if path is not None:
+            _file = open(path, "a", encoding="utf_8")
+
+def set_level(name):
+    """Set level from string `name`, e.g. "debug"."""
+    global level
+    level = LEVELS[name.lower()]
+
+def _start_writer():
+    """Start the background writer thread if not running."""
+    global _writer
+    if _writer is not None: return
+    with _lock:
+        if _writer is not None: return
+        _writer = threading.Thread(target=_write, name="log", daemon=True)
+        _writer.start()
+
+def warning(message, *args):
+    """Log `message` formatted with `args` at warning level."""
+    if level <= WARNING:
+        _log(WARNING, message, args)
+
+def _write():
+    """Write pending messages as they arrive."""
+    while True:
+        _wake.wait()
+        _wake.clear()
+        flush()
+
+
+# Don't lose pending messages at exit.
+atexit.register(flush)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Counters and latency histograms of hot paths.
+
+Metrics are recorded by name and label, e.g. ``http.latency`` by host or
+``provider.latency`` by provider and method. Use :meth:`Registry.snapshot`
+or :meth:`pan.Application.metrics` to get current values.
+"""
+
+import bisect
+import collections
+import contextlib
+import functools
+import os
+import pan
+import threading
+import time
+
+__all__ = ("Histogram", "Registry")
+
+# Upper bounds of histogram buckets in seconds.
+BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+
+    """A distribution of values in fixed buckets."""
+
+    __slots__ = ("buckets", "count", "max", "min", "sum")
+
+    def __init__(self):
+        """Initialize a :class:`Histogram` instance."""
+        self.buckets = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.max = None
+        self.min = None
+        self.sum = 0
+
+    def add(self, value):
+        """Add `value` to distribution."""
+        self.buckets[bisect.bisect_left(BOUNDS, value)] += 1
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+        self.sum += value
+
+    def to_dict(self):
+        """Return histogram as a dictionary."""
+        labels = ["<={:g}".format(x) for x in BOUNDS]
+        labels.append(">{:g}".format(BOUNDS[-1]))
+        return dict(buckets=dict(zip(labels, self.buckets)),
+                    count=self.count,
+                    max=self.max,
+                    mean=self.sum / max(1, self.count),
+                    min=self.min,
+                    sum=self.sum)
+
+
+class Registry:
+
+    """A thread-safe registry of counters and histograms."""
+
+    def __init__(self):
+        """Initialize a :class:`Registry` instance."""
+        self._counters = collections.defaultdict(int)
+        self._dump_stop = None
+        self._histograms = collections.defaultdict(Histogram)
+        self._lock = threading.Lock()
+
+    @pan.util.locked_method
+    def count(self, name, label, value=1):
+        """Increment counter `name` for `label` by `value`."""
+        self._counters[(name, label)] += value
+
+    @pan.util.locked_method
+    def observe(self, name, label, value):
+        """Add `value` to histogram `name` for `label`."""
+        self._histograms[(name, label)].add(value)
+
+    @pan.util.locked_method
+    def reset(self):
+        """Remove all recorded values."""
+        self._counters.clear()
+        self._histograms.clear()
+
+    @pan.util.locked_method
+    def snapshot(self):
+        """Return a dictionary of current values by name and label."""
+        counters, histograms = {}, {}
+        for (name, label), value in self._counters.items():
+            counters.setdefault(name, {})[label] = value
+        for (name, label), histogram in self._histograms.items():
+            histograms.setdefault(name, {})[label] = histogram.to_dict()
+        return dict(counters=counters, histograms=histograms)
+
+    def start_dump(self, interval, path=None):
+        """Write snapshot to `path` every `interval` seconds."""
+        self.stop_dump()
+        stop = self._dump_stop = threading.Event()
+        def dump():
+            while not stop.wait(interval):
+                self.write(path)
+        threading.Thread(target=dump, daemon=True).start()
+
+    def stop_dump(self):
+        """Stop periodic writing of snapshots."""
+        if self._dump_stop is None: return
+        self._dump_stop.set()
+        self._dump_stop = None
+
+    @contextlib.contextmanager
+    def timed(self, name, label):
+        """A context manager for adding time taken to histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, label, time.perf_counter() - start)
+
+    def timed_method(self, name):
+        """Decorator for adding time taken by provider methods to `name`."""
+        def outer_wrapper(function):
+            @functools.wraps(function)
+            def inner_wrapper(*args, **kwargs):
+                label = "{}.{}".format(args[0].id, function.__name__)
+                try:
+                    with self.timed(name, label):
+                        return function(*args, **kwargs)
+                except Exception:
+                    self.count("provider.errors", label)
+                    raise # Exception
+            return inner_wrapper
+        return outer_wrapper
+
+    def write(self, path=None):
+        """Write snapshot to JSON file at `path`."""
+        path = path or os.path.join(pan.CACHE_HOME_DIR, "metrics.json")
+        with pan.util.silent(Exception, tb=True):
+            pan.util.write_json(self.snapshot(), path)
+
+
+registry = Registry()
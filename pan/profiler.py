@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Sampling stacks of running threads.
+
+Start by setting the configuration option ``profile`` or calling
+:meth:`pan.Application.start_profiling`. Samples are written as collapsed
+stacks to ``profile.txt`` under :attr:`pan.CACHE_HOME_DIR`, which can be
+turned into a flame graph with e.g. ``flamegraph.pl`` or speedscope.
+"""
+
+import collections
+import os
+import pan
+import sys
+import threading
+
+__all__ = ("Profiler",)
+
+# Seconds between samples. Each sample walks the stacks of all threads,
+# so sample sparsely enough to not slow down a phone noticeably.
+INTERVAL = 0.1
+
+
+class Profiler:
+
+    """A profiler periodically sampling stacks of running threads."""
+
+    def __init__(self, interval=INTERVAL):
+        """Initialize a :class:`Profiler` instance."""
+        self._lock = threading.Lock()
+        self._stacks = collections.Counter()
+        self._stop = None
+        self.interval = interval
+
+    def _format_stack(self, frame, thread):
+        """Return `frame` and its callers as a collapsed stack."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            module = os.path.basename(code.co_filename)
+            names.append("{}:{}".format(module, code.co_name))
+            frame = frame.f_back
+        names.append(thread)
+        return ";".join(reversed(names))
+
+    def is_running(self):
+        """Return ``True`` if sampling stacks."""
+        return self._stop is not None
+
+    def _sample(self, stop):
+        """Sample stacks of other threads until `stop` is set."""
+        ident = threading.get_ident()
+        while not stop.wait(self.interval):
+            names = {x.ident: x.name for x in threading.enumerate()}
+            for thread, frame in sys._current_frames().items():
+                if thread == ident: continue
+                name = names.get(thread, str(thread))
+                stack = self._format_stack(frame, name)
+                with self._lock:
+                    self._stacks[stack] += 1
+
+    @pan.util.locked_method
+    def start(self):
+        """Start sampling stacks in a background thread."""
+        if self._stop is not None: return
+        self._stop = threading.Event()
+        thread = threading.Thread(target=self._sample,
+                                  args=(self._stop,),
+                                  name="profiler",
+                                  daemon=True)
+        thread.start()
+
+    def stop(self, path=None):
+        """Stop sampling stacks and write samples to file at `path`."""
+        with self._lock:
+            if self._stop is None: return
+            self._stop.set()
+            self._stop = None
+        self.write(path)
+
+    @pan.util.locked_method
+    def write(self, path=None):
+        """Write samples as collapsed stacks to file at `path`."""
+        if not self._stacks: return
+        path = path or os.path.join(pan.CACHE_HOME_DIR, "profile.txt")
+        with pan.util.silent(Exception, tb=True):
+            pan.util.makedirs(os.path.dirname(path))
+            with pan.util.atomic_open(path, "w") as f:
+                for stack, count in sorted(self._stacks.items()):
+                    f.write("{} {:d}\n".format(stack, count))
+        self._stacks.clear()
+
+
+profiler = Profiler()
@@ -17,15 +17,20 @@
 
 """A proxy for information from providers."""
 
-import copy
-import importlib.machinery
+import collections
+import inspect
 import os
 import pan
-import random
 import re
+import threading
+import time
 
 __all__ = ("Provider",)
 
+# Amount of previous departure lists to keep for diffs,
+# roughly one for each page that can be open at once.
+DEPARTURE_CACHE_SIZE = 10
+
 
 class Provider:
 
@@ -48,11 +53,21 @@ class Provider:
         self.description = values["description"]
         self.id = id
         self.name = values["name"]
+        self._departure_cache = collections.OrderedDict()
+        self._departure_options = set()
+        self._lock = threading.Lock()
+        self._module = None
+        self._module_path = re.sub(r"\.json$", ".py", path)
         self._path = path
-        self._provider = None
+        self._primed_departures = {}
         self._stop_cache = {}
         self.update_interval = int(values["update_interval"])
-        self._init_provider(id, re.sub(r"\.json$", ".py", path))
+        # Defer loading the module until first used, but fail early
+        # if there's nothing to load. This keeps startup fast when
+        # favorites refer to several providers.
+        if not os.path.isfile(self._module_path):
+            raise FileNotFoundError("Provider module {} not found"
+                                    .format(repr(self._module_path)))
 
     def _add_distances(self, items, x, y):
         """Store distances to given coordinates in-place to `items`."""
@@ -62,49 +77,124 @@ class Provider:
                     x, y, item["x"], item["y"]))
 
     @pan.util.api_query([])
-    def find_departures(self, stops, ignores=None):
-        """Return a list of departures from `stops`."""
+    @pan.metrics.registry.timed_method("provider.latency")
+    @pan.tracing.traced("provider")
+    def find_departures(self, stops, ignores=None, diff=False, page=None,
+                        limit=None, window=None):
+        """
+        Return a list of departures from `stops`.
+
+        If `diff` is ``True``, return instead a dictionary of changes since
+        the previous call from the same `page` with the same arguments, see
+        :func:`pan.util.diff_departures`. Return at most `limit` departures
+        leaving within `window` seconds from now, if ``None`` as configured.
+        """
         if not stops: return []
-        departures = self._provider.find_departures(stops)
-        departures = pan.util.filter_departures(departures, ignores)
+        if limit is None: limit = pan.conf.departure_limit
+        if window is None: window = pan.conf.departure_window
+        provider = self._provider
+        supported = self._departure_options
+        ignores = pan.util.compile_ignores(ignores or [])
+        options = dict(ignores=ignores, limit=limit, window=window)
+        options = {k: v for k, v in options.items() if v and k in supported}
+        if ignores and not "ignores" in supported:
+            # Let the provider query only as many departures as we show,
+            # but not if ignored lines are dropped afterwards, leaving
+            # too few.
+            options.pop("limit", None)
+        departures = self._pop_primed_departures(stops)
+        if departures is None:
+            with pan.tracing.span("{}.find_departures".format(self.id),
+                                  "module"):
+                departures = provider.find_departures(stops, **options)
+        with pan.tracing.span("filter_departures", "util"):
+            departures = pan.util.filter_departures(departures, ignores)
+        if window:
+            end = time.time() + window
+            departures = [x for x in departures if x["time"] <= end]
+        if limit:
+            departures = departures[:limit]
         for departure in departures:
+            departure["key"] = pan.util.departure_to_key(departure)
             if "x" in departure and "y" in departure: continue
             # Add coordinates from cache if not set by provider.
             stop = self._stop_cache.get(departure["stop"], None)
+            pan.metrics.registry.count(
+                "cache.hits" if stop else "cache.misses", "stops")
             stop = stop or dict(x=0, y=0)
             departure["x"] = stop["x"]
             departure["y"] = stop["y"]
-        return departures
+        key = (page, tuple(stops), ignores, limit, window)
+        previous = self._swap_departures(key, departures)
+        with pan.tracing.span("to_qml", "util"):
+            if not diff: return pan.util.records_to_dicts(departures)
+            return pan.util.diff_departures(previous, departures)
 
     @pan.util.api_query([])
+    @pan.metrics.registry.timed_method("provider.latency")
+    @pan.tracing.traced("provider")
     def find_lines(self, stops):
         """Return a list of lines that use `stops`."""
         if not stops: return []
-        return self._provider.find_lines(stops)
+        lines = self._provider.find_lines(stops)
+        return pan.util.records_to_dicts(lines)
 
     @pan.util.api_query([])
+    @pan.metrics.registry.timed_method("provider.latency")
+    @pan.tracing.traced("provider")
+    def find_nearby_departures(self, x, y, n=10):
+        """
+        Return a list of stops near given coordinates.
+
+        If supported by the provider, departures of the `n` nearest stops
+        are queried along with the stops and used for the next call of
+        :meth:`find_departures` for those stops.
+        """
+        provider = self._provider
+        if not hasattr(provider, "find_nearby_departures"):
+            stops = provider.find_nearby_stops(x, y)
+        else:
+            stops, departures = provider.find_nearby_departures(x, y, n)
+            self._prime_departures(departures)
+        stops = pan.util.sorted_by_distance(stops, x, y)
+        self.store_stops(stops)
+        self._add_distances(stops, x, y)
+        return pan.util.records_to_dicts(stops)
+
+    @pan.util.api_query([])
+    @pan.metrics.registry.timed_method("provider.latency")
+    @pan.tracing.traced("provider")
     def find_nearby_stops(self, x, y):
         """Return a list of stops near given coordinates."""
         stops = self._provider.find_nearby_stops(x, y)
         stops = pan.util.sorted_by_distance(stops, x, y)
         self.store_stops(stops)
         self._add_distances(stops, x, y)
-        return stops
+        return pan.util.records_to_dicts(stops)
 
     @pan.util.api_query([])
+    @pan.metrics.registry.timed_method("provider.latency")
+    @pan.tracing.traced("provider")
     def find_stops(self, query, x, y):
         """Return a list of stops matching `query`."""
         if not query: return []
         stops = self._provider.find_stops(query, x, y)
         self.store_stops(stops)
         self._add_distances(stops, x, y)
-        return stops
-
-    def _init_provider(self, id, path):
-        """Initialize transit provider module from `path`."""
-        name = "pan.provider{:d}".format(random.randrange(10**12))
-        loader = importlib.machinery.SourceFileLoader(name, path)
-        self._provider = loader.load_module(name)
+        return pan.util.records_to_dicts(stops)
+
+    @pan.util.locked_method
+    def _init_provider(self):
+        """Initialize transit provider module."""
+        if self._module is not None: return
+        with pan.startup.phase("Provider {}".format(self.id)):
+            module = pan.util.load_module(self._module_path)
+        # Check which optional arguments find_departures accepts.
+        signature = inspect.signature(module.find_departures)
+        options = {"ignores", "limit", "window"}
+        options &= set(signature.parameters)
+        self._departure_options = options
+        self._module = module
 
     def _load_attributes(self, id):
         """Read and return attributes from JSON file."""
@@ -114,7 +204,49 @@ class Provider:
             path = os.path.join(pan.DATA_DIR, leaf)
         return path, pan.util.read_json(path)
 
+    @pan.util.locked_method
+    def _pop_primed_departures(self, stops):
+        """Return departures from `stops` primed recently or ``None``."""
+        # Use primed departures only once, so that
+        # subsequent updates bring fresh departures.
+        primed = [self._primed_departures.pop(x, None) for x in stops]
+        if not all(primed): return None
+        if any(time.time() - found > self.update_interval
+               for found, departures in primed): return None
+        return pan.util.sorted_departures([
+            x for found, departures in primed for x in departures])
+
+    @pan.util.locked_method
+    def _prime_departures(self, departures):
+        """Store `departures` to use for next :meth:`find_departures`."""
+        # Prime only stops found in departures, since other stops
+        # may have been left out of the query instead of having none.
+        found = time.time()
+        stops = {}
+        for departure in departures:
+            stops.setdefault(departure["stop"], []).append(departure)
+        for stop, items in stops.items():
+            self._primed_departures[stop] = (found, items)
+
+    @property
+    def _provider(self):
+        """Return transit provider module, loading on first use."""
+        if self._module is None:
+            self._init_provider()
+        return self._module
+
+    @pan.util.locked_method
+    def _swap_departures(self, key, departures):
+        """Store `departures` for `key` and return previous or blank."""
+        previous = self._departure_cache.pop(key, [])
+        self._departure_cache[key] = departures
+        while len(self._departure_cache) > DEPARTURE_CACHE_SIZE:
+            self._departure_cache.popitem(last=False)
+        return previous
+
     def store_stops(self, stops):
         """Inject `stops` into the cache of seen stops."""
-        for stop in copy.deepcopy(stops):
-            self._stop_cache[stop["id"]] = stop
+        # Only coordinates are needed to fill in departures.
+        for stop in stops:
+            self._stop_cache[stop["id"]] = pan.Stop(
+                id=stop["id"], x=stop["x"], y=stop["y"])
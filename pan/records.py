@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compact records of departures, lines and stops."""
+
+__all__ = ("Departure", "Line", "Record", "Stop")
+
+
+class Record:
+
+    """
+    Base class for compact records with dictionary-style access.
+
+    Fields are defined by ``__slots__`` in subclasses. Fields not given
+    at initialization are missing, as keys would be from a dictionary.
+    Use :meth:`to_dict` to convert to a dictionary for passing to QML.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        """Initialize from keyword arguments of field values."""
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __contains__(self, name):
+        """Return ``True`` if field `name` is set."""
+        return hasattr(self, name)
+
+    def __eq__(self, other):
+        """Return ``True`` if `other` has equal field values."""
+        if not isinstance(other, (Record, dict)):
+            return NotImplemented
+        return self.to_dict() == dict(other)
+
+    def __getitem__(self, name):
+        """Return the value of field `name`."""
+        try:
+            return getattr(self, name)
+        except AttributeError as error:
+            raise KeyError(str(error))
+
+    def __iter__(self):
+        """Return an iterator over names of set fields."""
+        return iter(self.keys())
+
+    def __len__(self):
+        """Return the amount of set fields."""
+        return len(self.keys())
+
+    def __repr__(self):
+        """Return a string representation of record."""
+        return "{}({})".format(self.__class__.__name__, ", ".join(
+            "{}={}".format(x, repr(getattr(self, x))) for x in self.keys()))
+
+    def __setitem__(self, name, value):
+        """Set the value of field `name`."""
+        try:
+            return setattr(self, name, value)
+        except AttributeError as error:
+            raise KeyError(str(error))
+
+    def get(self, name, default=None):
+        """Return the value of field `name` or `default`."""
+        return getattr(self, name, default)
+
+    def keys(self):
+        """Return a list of names of set fields."""
+        return [x for x in self.__slots__ if hasattr(self, x)]
+
+    def to_dict(self):
+        """Return record as a dictionary of set fields."""
+        return {x: getattr(self, x) for x in self.keys()}
+
+
+class Departure(Record):
+
+    """A departure from a stop."""
+
+    __slots__ = (
+        "color",
+        "destination",
+        "key",
+        "line",
+        "realtime",
+        "scheduled_time",
+        "stop",
+        "time",
+        "x",
+        "y",
+    )
+
+
+class Line(Record):
+
+    """A line that uses a stop."""
+
+    __slots__ = (
+        "color",
+        "destination",
+        "id",
+        "name",
+    )
+
+
+class Stop(Record):
+
+    """A stop from which lines depart."""
+
+    __slots__ = (
+        "color",
+        "description",
+        "dist",
+        "id",
+        "line_summary",
+        "name",
+        "x",
+        "y",
+    )
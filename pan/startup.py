@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tracing where time is spent at startup.
+
+Enable by setting the environment variable ``PAN_TRANSIT_TRACE_STARTUP``
+to a non-blank value. Timings of startup phases and imports of modules are
+then written to ``startup.json`` under :attr:`pan.CACHE_HOME_DIR`, which
+can be viewed with ``tools/startup-report``.
+"""
+
+# This module is imported before any other part of pan
+# in order to trace imports, so don't import pan here.
+import builtins
+import contextlib
+import os
+import sys
+import time
+
+ENABLED = bool(os.getenv("PAN_TRANSIT_TRACE_STARTUP", "").strip())
+
+_depth = 0
+_imports = []
+_original_import = builtins.__import__
+_phases = []
+_start = time.perf_counter()
+
+
+def _import(name, globals=None, locals=None, fromlist=(), level=0):
+    """Import module `name`, recording time taken if not yet imported."""
+    global _depth
+    # Submodules can be imported via fromlist, e.g. 'from pan import util',
+    # but fromlist can contain other attributes too, so check afterwards
+    # which of the candidates were actually imported.
+    names = [name] + ["{}.{}".format(name, x) for x in fromlist or ()]
+    names = [x for x in names if not x in sys.modules]
+    if level > 0 or not names:
+        return _original_import(name, globals, locals, fromlist, level)
+    item = dict(name=None, depth=_depth, start=_elapsed())
+    _imports.append(item)
+    _depth += 1
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth -= 1
+        item["duration"] = _elapsed() - item["start"]
+        item["name"] = ", ".join(x for x in names if x in sys.modules)
+
+def _elapsed():
+    """Return seconds elapsed since start of tracing."""
+    return time.perf_counter() - _start
+
+def install():
+    """Start tracing imports if enabled."""
+    if not ENABLED: return
+    builtins.__import__ = _import
+
+@contextlib.contextmanager
+def phase(name):
+    """A context manager for tracing time spent in phase `name`."""
+    if not ENABLED:
+        yield
+        return
+    global _depth
+    item = dict(name=name, depth=_depth, start=_elapsed())
+    _phases.append(item)
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        item["duration"] = _elapsed() - item["start"]
+
+def uninstall():
+    """Stop tracing imports."""
+    builtins.__import__ = _original_import
+
+def write(path=None):
+    """Stop tracing and write report to JSON file at `path`."""
+    if not ENABLED: return
+    uninstall()
+    import pan
+    path = path or os.path.join(pan.CACHE_HOME_DIR, "startup.json")
+    report = dict(imports=[x for x in _imports if x["name"]],
+                  phases=_phases,
+                  total=_elapsed(),
+                  version=pan.__version__)
+
+    with pan.util.silent(Exception, tb=True):
+        pan.util.write_json(report, path)
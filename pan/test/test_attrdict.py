@@ -78,3 +78,52 @@ class TestAttrDict(pan.test.TestCase):
         self.dct.update(d=dict(e=1, f=dict(g=1)))
         assert isinstance(self.dct.d, pan.AttrDict)
         assert isinstance(self.dct.d.f, pan.AttrDict)
+
+
+class TestAttrView(pan.test.TestCase):
+
+    def setup_method(self, method):
+        self.data = dict(a=1, b=[1, 2, dict(c=3)], d=dict(e=dict(f=4)))
+        self.view = pan.AttrView(self.data)
+
+    def test___bool__(self):
+        assert self.view
+        assert not pan.AttrView({})
+
+    def test___contains__(self):
+        assert "a" in self.view
+        assert not "c" in self.view
+
+    def test___getattr__(self):
+        assert self.view.a == 1
+        assert self.view.d.e.f == 4
+        assert self.view.b[2].c == 3
+
+    def test___getattr____missing(self):
+        assert not hasattr(self.view, "x")
+        assert not hasattr(self.view.b, "x")
+
+    def test___getitem__(self):
+        assert self.view["a"] == 1
+        assert isinstance(self.view["d"], pan.AttrView)
+
+    def test___iter__(self):
+        assert list(self.view) == ["a", "b", "d"]
+        assert list(self.view.b)[:2] == [1, 2]
+        assert list(self.view.b)[2].c == 3
+
+    def test___len__(self):
+        assert len(self.view) == 3
+        assert len(self.view.b) == 3
+
+    def test___setattr__(self):
+        self.assert_raises(AttributeError, setattr, self.view, "a", 2)
+
+    def test_get(self):
+        assert self.view.get("a") == 1
+        assert self.view.get("x", 2) == 2
+        assert self.view.get("d").e.f == 4
+
+    def test_view(self):
+        self.data["d"]["e"]["f"] = 5
+        assert self.view.d.e.f == 5
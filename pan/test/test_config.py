@@ -95,3 +95,12 @@ class TestConfigurationStore(pan.test.TestCase):
         assert not pan.conf
         pan.conf.read(self.path)
         assert pan.conf.provider == "foo"
+
+    def test_write__unchanged(self):
+        pan.conf.write(self.path)
+        with open(self.path, "w") as f: f.write("{}")
+        pan.conf.write(self.path)
+        assert open(self.path, "r").read() == "{}"
+        pan.conf.provider = "foo"
+        pan.conf.write(self.path)
+        assert open(self.path, "r").read() != "{}"
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pan.test
+import tempfile
+import threading
+
+
+class Provider:
+
+    """A stand-in provider not making any requests."""
+
+    def find_lines(self, stops):
+        return [dict(color="#ff0000", destination="A", id="1", name="1")]
+
+    def store_stops(self, stops):
+        pass
+
+
+class TestFavorites(pan.test.TestCase):
+
+    def setup_method(self, method):
+        pan.conf.provider = pan.conf.get_default("provider")
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "favorites.json")
+        self.favorites = pan.Favorites(self.path)
+        self.favorites.get_provider = lambda key: Provider()
+        self.key = self.favorites.add("test")
+        self.favorites.add_stop(self.key, dict(
+            id="b", name="B", x=24.0, y=60.0, color="#ff0000"))
+        self.favorites.add_stop(self.key, dict(
+            id="a", name="A", x=26.0, y=62.0, color="#0000ff"))
+
+    def teardown_method(self, method):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_favorites(self):
+        favorites = self.favorites.favorites
+        favorite = [x for x in favorites if x["key"] == self.key][0]
+        assert favorite["color"] == "#0000ff"
+        assert [x.id for x in favorite["stops"]] == ["a", "b"]
+
+    def test_get(self):
+        assert self.favorites.get(self.key).name == "test"
+        self.assert_raises(LookupError, self.favorites.get, "xxx")
+
+    def test_get_color(self):
+        assert self.favorites.get_color(self.key) == "#0000ff"
+        self.favorites.remove_stop(self.key, "a")
+        assert self.favorites.get_color(self.key) == "#ff0000"
+
+    def test_get_line_summary(self):
+        self.favorites._update_lines(self.key, Provider())
+        assert self.favorites.get_line_summary(self.key) == "1"
+
+    def test_get_line_summary__invalidated(self):
+        def summarize(favorite):
+            # As if lines were updated in a worker thread meanwhile.
+            self.favorites._invalidate(self.key)
+            return "stale"
+        value = self.favorites._get_cached(self.key, "x", summarize)
+        assert value == "stale"
+        assert not "x" in self.favorites._cache.get(self.key, {})
+
+    def test_get_stop_ids(self):
+        assert self.favorites.get_stop_ids(self.key) == ["a", "b"]
+
+    def test_remove(self):
+        self.favorites.remove(self.key)
+        self.assert_raises(LookupError, self.favorites.get, self.key)
+
+    def test_remove_stop(self):
+        self.favorites.remove_stop(self.key, "a")
+        assert self.favorites.get_stop_ids(self.key) == ["b"]
+        favorite = self.favorites.get(self.key)
+        assert favorite.x == 24.0
+        assert favorite.y == 60.0
+
+    def test_set_ignore_lines(self):
+        ignores = [dict(name="4", destination="Munkkiniemi")]
+        self.favorites.set_ignore_lines(self.key, ignores)
+        ignores = self.favorites.get_ignore_set(self.key)
+        assert ignores == frozenset([("4", "munkkiniemi")])
+
+    def test_write(self):
+        self.favorites.write()
+        favorites = pan.Favorites(self.path)
+        assert favorites.get_name(self.key) == "test"
+
+    def test_write__concurrent(self):
+        # Writes run from a timer thread while favorites are edited.
+        thread = threading.Thread(target=lambda: [
+            self.favorites.write() for i in range(100)])
+        thread.start()
+        for i in range(100):
+            self.favorites.remove(self.favorites.add(str(i)))
+        thread.join()
+        self.favorites.write()
+        favorites = pan.Favorites(self.path)
+        assert [x["name"] for x in favorites.favorites] == ["test"]
@@ -15,18 +15,33 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import pan.test
+import tempfile
 
 
 class TestHistory(pan.test.TestCase):
 
     def setup_method(self, method):
-        self.history = pan.History()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "history.json")
+        self.history = pan.History(self.path)
+
+    def teardown_method(self, method):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
 
     def test_add(self):
         self.history.add("test")
         assert self.history.queries[0] == "test"
 
+    def test_add__existing(self):
+        self.history.add("test")
+        self.history.add("foo")
+        self.history.add("TEST")
+        assert self.history.queries == ["TEST", "foo"]
+
     def test_queries(self):
         self.history.add("test")
         assert self.history.queries
@@ -36,3 +51,52 @@ class TestHistory(pan.test.TestCase):
         assert self.history.queries[0] == "test"
         self.history.remove("test")
         assert not self.history.queries
+
+    def test_suggest(self):
+        for query in ["bar", "foo", "Foobar", "afoo", "foo"]:
+            self.history.add(query)
+        assert self.history.suggest("FOO") == ["foo", "Foobar", "afoo"]
+        assert self.history.suggest("foo", 1) == ["foo"]
+        assert self.history.suggest("") == ["foo", "afoo", "Foobar", "bar"]
+        assert self.history.suggest("xxx") == []
+
+    def test_suggest__removed(self):
+        self.history.add("foo")
+        self.history.remove("foo")
+        assert self.history.suggest("f") == []
+
+    def test_write(self):
+        self.history.add("foo")
+        self.history.add("bar")
+        self.history.add("baz")
+        self.history.remove("bar")
+        self.history.write()
+        assert not os.path.isfile(self.path)
+        history = pan.History(self.path)
+        assert history.queries == ["baz", "foo"]
+
+    def test_write__compact(self):
+        for i in range(pan.history.MAX_JOURNAL + 1):
+            self.history.add(str(i))
+        self.history.write()
+        assert os.path.isfile(self.path)
+        assert not os.path.isfile(self.history._journal_path)
+        history = pan.History(self.path)
+        assert history.queries == self.history.queries
+
+    def test_write__compact_counts(self):
+        self.history.add("foo")
+        self.history.add("foobar")
+        self.history.add("foobar")
+        for i in range(pan.history.MAX_JOURNAL + 1):
+            self.history.add(str(i))
+        self.history.write()
+        history = pan.History(self.path)
+        assert history.suggest("foo") == ["foobar", "foo"]
+
+    def test_suggest__after_changes(self):
+        self.history.add("foo")
+        assert self.history.suggest("o") == ["foo"]
+        self.history.add("boo")
+        self.history.remove("foo")
+        assert self.history.suggest("o") == ["boo"]
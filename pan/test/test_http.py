@@ -15,11 +15,66 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import http.server
+import os
 import pan.test
+import tempfile
 import threading
 import time
 
 
+class TestCassette(pan.test.TestCase):
+
+    def setup_method(self, method):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+            def log_message(self, *args): pass
+        address = ("127.0.0.1", 0)
+        self.server = http.server.HTTPServer(address, Handler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = "http://127.0.0.1:{:d}/".format(self.server.server_port)
+        handle, self.path = tempfile.mkstemp()
+
+    def teardown_method(self, method):
+        pan.http.eject_cassette()
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.path)
+
+    def test_record(self):
+        pan.http.use_cassette(self.path, "record")
+        assert pan.http.get(self.url, encoding="utf_8") == "ok"
+        pan.http.eject_cassette()
+        requests = pan.util.read_json(self.path)["requests"]
+        assert requests[0]["response"] == "ok"
+        assert requests[0]["status"] == 200
+        assert requests[0]["url"] == self.url
+
+    def test_replay(self):
+        pan.http.use_cassette(self.path, "record")
+        pan.http.get(self.url)
+        pan.http.eject_cassette()
+        self.server.shutdown()
+        pan.http.use_cassette(self.path, "replay", scale=0)
+        assert pan.http.get(self.url, encoding="utf_8") == "ok"
+
+    def test_record__binary(self):
+        pan.http.use_cassette(self.path, "record")
+        pan.http.cassette.add("POST", self.url, b"\xe4", 200, b"\xe4abc", 0)
+        pan.http.eject_cassette()
+        pan.http.use_cassette(self.path, "replay", scale=0)
+        assert pan.http.post(self.url, b"\xe4") == b"\xe4abc"
+
+    def test_replay__missing(self):
+        pan.util.write_json(dict(requests=[]), self.path)
+        pan.http.use_cassette(self.path, "replay")
+        self.assert_raises(Exception, pan.http.get, self.url)
+
+
 class TestConnectionPool(pan.test.TestCase):
 
     def setup_method(self, method):
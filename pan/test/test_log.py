@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pan.test
+import tempfile
+
+
+class TestModule(pan.test.TestCase):
+
+    def setup_method(self, method):
+        pan.log.set_level("debug")
+        pan.log._records.clear()
+
+    def teardown_method(self, method):
+        pan.log.set_file(None)
+        pan.log.set_level("info")
+
+    def test_debug(self):
+        pan.log.debug("GET {}", "http://example.com/")
+        assert pan.log.records()[-1].endswith("DEBUG: GET http://example.com/")
+
+    def test_debug__level(self):
+        pan.log.set_level("info")
+        pan.log.debug("GET {}", "http://example.com/")
+        assert not pan.log.records()
+
+    def test_exception(self):
+        try:
+            raise ValueError("{}")
+        except ValueError:
+            pan.log.exception("Failed {}", 1)
+        record = pan.log.records()[-1]
+        assert "ERROR: Failed 1" in record
+        assert "ValueError: {}" in record
+
+    def test_set_file(self):
+        handle, path = tempfile.mkstemp()
+        pan.log.set_file(path)
+        pan.log.warning("Discarding {}", "x")
+        pan.log.flush()
+        with open(path, "r") as f:
+            assert f.read().endswith("WARNING: Discarding x\n")
+        os.remove(path)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import pan.test
+import tempfile
+
+
+class TestHistogram(pan.test.TestCase):
+
+    def test_add(self):
+        histogram = pan.metrics.Histogram()
+        histogram.add(0.02)
+        histogram.add(0.3)
+        histogram = histogram.to_dict()
+        assert histogram["count"] == 2
+        assert histogram["min"] == 0.02
+        assert histogram["max"] == 0.3
+        assert histogram["buckets"]["<=0.025"] == 1
+        assert histogram["buckets"]["<=0.5"] == 1
+
+
+class TestRegistry(pan.test.TestCase):
+
+    def setup_method(self, method):
+        self.registry = pan.metrics.Registry()
+
+    def test_count(self):
+        self.registry.count("http.requests", "example.com")
+        self.registry.count("http.requests", "example.com", 2)
+        counters = self.registry.snapshot()["counters"]
+        assert counters["http.requests"]["example.com"] == 3
+
+    def test_observe(self):
+        self.registry.observe("http.latency", "example.com", 0.1)
+        histograms = self.registry.snapshot()["histograms"]
+        assert histograms["http.latency"]["example.com"]["count"] == 1
+
+    def test_reset(self):
+        self.registry.count("http.requests", "example.com")
+        self.registry.reset()
+        assert self.registry.snapshot() == dict(counters={}, histograms={})
+
+    def test_timed(self):
+        with self.registry.timed("http.latency", "example.com"):
+            pass
+        histograms = self.registry.snapshot()["histograms"]
+        assert histograms["http.latency"]["example.com"]["count"] == 1
+
+    def test_timed_method(self):
+        class Provider:
+            id = "test"
+            @self.registry.timed_method("provider.latency")
+            def find_stops(self):
+                raise ValueError
+        with pan.util.silent(ValueError):
+            Provider().find_stops()
+        snapshot = self.registry.snapshot()
+        assert snapshot["counters"]["provider.errors"]["test.find_stops"] == 1
+        assert snapshot["histograms"]["provider.latency"]["test.find_stops"]
+
+    def test_write(self):
+        self.registry.count("http.requests", "example.com")
+        handle, path = tempfile.mkstemp()
+        self.registry.write(path)
+        with open(path, "r") as f:
+            assert json.load(f) == self.registry.snapshot()
+        os.remove(path)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pan.test
+import tempfile
+import threading
+import time
+
+
+class TestProfiler(pan.test.TestCase):
+
+    def setup_method(self, method):
+        self.profiler = pan.profiler.Profiler(0.001)
+        handle, self.path = tempfile.mkstemp()
+
+    def teardown_method(self, method):
+        self.profiler.stop(self.path)
+        os.remove(self.path)
+
+    def test_start(self):
+        done = threading.Event()
+        def work():
+            while not done.is_set():
+                sum(range(1000))
+        thread = threading.Thread(target=work, name="work")
+        thread.start()
+        self.profiler.start()
+        assert self.profiler.is_running()
+        time.sleep(0.2)
+        done.set()
+        thread.join()
+        self.profiler.stop(self.path)
+        with open(self.path, "r") as f:
+            lines = f.read().splitlines()
+        assert any(x.startswith("work;") and
+                   "test_profiler.py:work" in x for x in lines)
+        assert all(int(x.split()[-1]) > 0 for x in lines)
+
+    def test_stop(self):
+        self.profiler.start()
+        self.profiler.stop(self.path)
+        assert not self.profiler.is_running()
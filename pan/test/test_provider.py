@@ -15,12 +15,104 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import os
 import pan.test
+import tempfile
+import time
 
 
 class TestProvider(pan.test.TestCase):
 
+    def setup_method(self, method):
+        handle, self.path = tempfile.mkstemp()
+
+    def teardown_method(self, method):
+        pan.http.eject_cassette()
+        os.remove(self.path)
+
+    def replay(self, url, response):
+        request = dict(body="", duration=0, method="POST",
+                       response=json.dumps(response), status=200, url=url)
+        pan.util.write_json(dict(requests=[request]), self.path)
+        pan.http.use_cassette(self.path, "replay")
+
     def test___new____yes(self):
         a = pan.Provider("digitransit_hsl")
         b = pan.Provider("digitransit_hsl")
         assert a is b
+
+    def test___init____missing(self):
+        self.assert_raises(Exception, pan.Provider, "xxx")
+
+    def test__provider(self):
+        provider = pan.Provider("digitransit_finland")
+        assert callable(provider._provider.find_departures)
+        assert provider._provider is provider._provider
+
+    def test_find_departures__diff(self):
+        stops = [dict(gtfsId="HSL:0", lat=60.1, lon=24.9,
+                      stoptimesWithoutPatterns=[dict(
+                          realtime=False,
+                          realtimeDeparture=60 * i,
+                          scheduledDeparture=60 * i,
+                          serviceDay=int(time.time()),
+                          trip=dict(route=dict(mode="BUS", shortName=str(i)),
+                                    tripHeadsign="Kamppi"),
+                      ) for i in range(3)])]
+        provider = pan.Provider("digitransit_hsl")
+        url = provider._provider.digitransit.URL.format(region="hsl")
+        self.replay(url, dict(data=dict(stops=stops)))
+        assert len(provider.find_departures(["HSL:0"], [], False, "a")) == 3
+        diff = provider.find_departures(["HSL:0"], [], True, "b", limit=2)
+        # Diff against nothing, not the list of page "a".
+        assert len(diff["inserted"]) == 2
+        assert len(diff["keys"]) == 2
+        diff = provider.find_departures(["HSL:0"], [], True, "a")
+        assert diff["inserted"] == []
+        assert len(diff["keys"]) == 3
+
+    def test_find_departures__limit(self):
+        stops = [dict(gtfsId="HSL:{:d}".format(i), lat=60.1, lon=24.9,
+                      stoptimesWithoutPatterns=[dict(
+                          realtime=False,
+                          realtimeDeparture=60 * j + i,
+                          scheduledDeparture=60 * j + i,
+                          serviceDay=int(time.time()),
+                          trip=dict(route=dict(mode="BUS", shortName="1"),
+                                    tripHeadsign="Kamppi"),
+                      ) for j in range(3)]) for i in range(2)]
+        provider = pan.Provider("digitransit_hsl")
+        url = provider._provider.digitransit.URL.format(region="hsl")
+        self.replay(url, dict(data=dict(stops=stops)))
+        assert provider._departure_options == {"ignores", "limit", "window"}
+        departures = provider.find_departures(["HSL:0", "HSL:1"], limit=4)
+        assert [x["stop"] for x in departures] == ["HSL:0", "HSL:1"] * 2
+
+    def test_find_nearby_departures(self):
+        stops = [dict(code=str(i), desc="", gtfsId="HSL:{:d}".format(i),
+                      lat=60.1 + i / 1000, lon=24.9, name="Kamppi",
+                      patterns=[]) for i in range(3)]
+        nearest = [dict(gtfsId=x["gtfsId"], lat=x["lat"], lon=x["lon"],
+                        stoptimesWithoutPatterns=[dict(
+                            realtime=False,
+                            realtimeDeparture=60 * j,
+                            scheduledDeparture=60 * j,
+                            serviceDay=int(time.time()),
+                            trip=dict(route=dict(mode="BUS", shortName="1"),
+                                      tripHeadsign="Kamppi"),
+                        ) for j in range(3)]) for x in stops[:2]]
+        edges = lambda x: dict(edges=[dict(node=dict(stop=y)) for y in x])
+        provider = pan.Provider("digitransit_hsl")
+        url = provider._provider.digitransit.URL.format(region="hsl")
+        self.replay(url, dict(data=dict(departures=edges(nearest),
+                                        stops=edges(stops))))
+        stops = provider.find_nearby_departures(24.9, 60.1, 2)
+        assert [x["id"] for x in stops] == ["HSL:0", "HSL:1", "HSL:2"]
+        # Departures of the nearest stops should not need requests.
+        pan.util.write_json(dict(requests=[]), self.path)
+        pan.http.use_cassette(self.path, "replay")
+        assert len(provider.find_departures(["HSL:0"])) == 3
+        assert len(provider.find_departures(["HSL:1"])) == 3
+        assert provider.find_departures(["HSL:0"]) == []
+        assert provider.find_departures(["HSL:2"]) == []
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import pan.test
+
+
+class TestRecord(pan.test.TestCase):
+
+    def setup_method(self, method):
+        self.line = pan.Line(name="4", destination="Munkkiniemi")
+
+    def test___contains__(self):
+        assert "name" in self.line
+        assert not "color" in self.line
+
+    def test___eq__(self):
+        assert self.line == pan.Line(name="4", destination="Munkkiniemi")
+        assert self.line == dict(name="4", destination="Munkkiniemi")
+        assert self.line != pan.Line(name="4", destination="Katajanokka")
+
+    def test___getitem__(self):
+        assert self.line["name"] == "4"
+        self.assert_raises(KeyError, lambda: self.line["color"])
+
+    def test___init____bad_field(self):
+        self.assert_raises(AttributeError, pan.Line, foo="bar")
+
+    def test___setitem__(self):
+        self.line["color"] = "#00985f"
+        assert self.line.color == "#00985f"
+
+    def test___setitem____bad_field(self):
+        self.assert_raises(KeyError, self.line.__setitem__, "foo", "bar")
+
+    def test_copy(self):
+        line = copy.deepcopy(self.line)
+        assert line == self.line
+        assert line is not self.line
+
+    def test_get(self):
+        assert self.line.get("name") == "4"
+        assert self.line.get("color", "#000000") == "#000000"
+
+    def test_keys(self):
+        assert self.line.keys() == ["destination", "name"]
+
+    def test_to_dict(self):
+        assert self.line.to_dict() == dict(name="4", destination="Munkkiniemi")
+        assert dict(self.line) == dict(name="4", destination="Munkkiniemi")
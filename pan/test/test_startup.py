@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import pan.test
+import sys
+import tempfile
+
+
+class TestModule(pan.test.TestCase):
+
+    def setup_method(self, method):
+        pan.startup.ENABLED = True
+        pan.startup._imports.clear()
+        pan.startup._phases.clear()
+
+    def teardown_method(self, method):
+        pan.startup.uninstall()
+        pan.startup.ENABLED = False
+
+    def test_install(self):
+        sys.modules.pop("colorsys", None)
+        pan.startup.install()
+        import colorsys
+        assert colorsys
+        pan.startup.uninstall()
+        names = [x["name"] for x in pan.startup._imports]
+        assert "colorsys" in names
+
+    def test_phase(self):
+        with pan.startup.phase("a"):
+            with pan.startup.phase("b"):
+                pass
+        phases = pan.startup._phases
+        assert [x["name"] for x in phases] == ["a", "b"]
+        assert [x["depth"] for x in phases] == [0, 1]
+        assert phases[0]["duration"] >= phases[1]["duration"]
+
+    def test_phase__disabled(self):
+        pan.startup.ENABLED = False
+        with pan.startup.phase("a"):
+            pass
+        assert not pan.startup._phases
+
+    def test_write(self):
+        with pan.startup.phase("a"):
+            pass
+        handle, path = tempfile.mkstemp()
+        pan.startup.write(path)
+        with open(path, "r") as f:
+            report = json.load(f)
+        assert report["phases"][0]["name"] == "a"
+        assert report["version"] == pan.__version__
+        os.remove(path)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import pan.test
+import tempfile
+import threading
+
+
+class TestModule(pan.test.TestCase):
+
+    def setup_method(self, method):
+        pan.tracing.start()
+        pan.tracing._events.clear()
+        pan.tracing._threads.clear()
+
+    def teardown_method(self, method):
+        pan.tracing.ENABLED = False
+        pan.tracing._events.clear()
+
+    def test_span(self):
+        with pan.tracing.span("a", url="x"):
+            with pan.tracing.span("b"):
+                pass
+        b, a = pan.tracing._events
+        assert a["name"] == "a"
+        assert a["args"]["url"] == "x"
+        assert a["args"]["parent"] is None
+        assert b["args"]["parent"] == a["args"]["id"]
+        assert a["dur"] >= b["dur"]
+
+    def test_span__disabled(self):
+        pan.tracing.ENABLED = False
+        with pan.tracing.span("a"):
+            pass
+        assert not pan.tracing._events
+
+    def test_span__thread(self):
+        def run():
+            with pan.tracing.span("b"):
+                pass
+        with pan.tracing.span("a"):
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+        b, a = pan.tracing._events
+        assert b["args"]["parent"] is None
+        assert b["tid"] != a["tid"]
+
+    def test_traced(self):
+        class Favorites:
+            @pan.tracing.traced("favorites")
+            def find_departures(self):
+                with pan.tracing.span("b"):
+                    return 1
+        assert Favorites().find_departures() == 1
+        b, a = pan.tracing._events
+        assert a["name"].endswith("Favorites.find_departures")
+        assert b["args"]["parent"] == a["args"]["id"]
+
+    def test_write(self):
+        with pan.tracing.span("a"):
+            pass
+        handle, path = tempfile.mkstemp()
+        pan.tracing.write(path)
+        with open(path, "r") as f:
+            events = json.load(f)["traceEvents"]
+        assert [x["ph"] for x in events] == ["X", "M"]
+        assert not pan.tracing._events
+        os.remove(path)
@@ -18,6 +18,7 @@
 import os
 import pan.test
 import tempfile
+import time
 
 
 class TestModule(pan.test.TestCase):
@@ -44,12 +45,36 @@ class TestModule(pan.test.TestCase):
         dist = pan.util.calculate_distance(24.94, 60.17, -9.14, 38.72)
         assert round(dist/1000) == 3361
 
+    def test_compile_ignores(self):
+        ignores = [dict(name="B", destination="BBB")]
+        value = pan.util.compile_ignores(ignores)
+        assert value == frozenset([("b", "bbb")])
+        assert pan.util.compile_ignores(value) is value
+
+    def test_departure_to_key(self):
+        departure = dict(stop="a", line="1", scheduled_time=1000)
+        assert pan.util.departure_to_key(departure) == "a|1|1000"
+
+    def test_diff_departures(self):
+        a = dict(key="a", time=1)
+        b = dict(key="b", time=2)
+        c = dict(key="c", time=3)
+        d = dict(key="d", time=4)
+        diff = pan.util.diff_departures([a, b, c], [a, dict(c, time=5), d])
+        assert diff["removed"] == ["b"]
+        assert diff["changed"] == [dict(key="c", time=5)]
+        assert diff["inserted"] == [dict(key="d", time=4)]
+        assert diff["keys"] == ["a", "c", "d"]
+
     def test_filter_departures(self):
         a = dict(line="a", destination="aaa")
         b = dict(line="b", destination="bbb")
         ignores = [dict(name="B", destination="BBB")]
         value = pan.util.filter_departures([a, b], ignores)
         assert value == [a]
+        ignores = pan.util.compile_ignores(ignores)
+        value = pan.util.filter_departures([a, b], ignores)
+        assert value == [a]
 
     def test_filter_lines(self):
         a = dict(name="a", destination="aaa")
@@ -58,6 +83,15 @@ class TestModule(pan.test.TestCase):
         value = pan.util.filter_lines([a, b], ignores)
         assert value == [a]
 
+    def test_format_departures(self):
+        a = dict(time=time.time() + 300, x=24.94, y=60.17)
+        b = dict(time=time.time() - 300, x=24.94, y=60.17, color="#ffffff")
+        values = pan.util.format_departures([a, b], 24.94, 60.17)
+        assert values[0]["time_qml"] == "4 min"
+        assert values[0]["color_qml"] == "#3890ff"
+        assert values[1]["time_qml"] == ""
+        assert values[1]["color_qml"] == "#ffffff"
+
     def test_format_distance_american(self):
         assert pan.util.format_distance_american(123, 2) == "120 ft"
         assert pan.util.format_distance_american(6000, 1) == "1 mi"
@@ -85,6 +119,20 @@ class TestModule(pan.test.TestCase):
         lines = ["Arles", "Bordeaux 11", "Bordeaux 12", "Cannes"]
         assert sorted(lines[::-1], key=key) == lines
 
+    def test_line_to_sort_key__4(self):
+        key = pan.util.line_to_sort_key
+        lines = ["", "2", "10", "10A", "M", "M1", "M02", "M10"]
+        assert sorted(lines[::-1], key=key) == lines
+
+    def test_load_module(self):
+        path = os.path.join(pan.DATA_DIR, "providers", "digitransit.py")
+        a = pan.util.load_module(path)
+        b = pan.util.load_module(path)
+        a.REGION = "hsl"
+        assert a is not b
+        assert b.REGION is None
+        assert callable(b.find_departures)
+
     def test_most_common(self):
         assert pan.util.most_common([1,1,1,2,2,3]) == 1
         assert pan.util.most_common([2,2,1,1]) == 1
@@ -95,3 +143,15 @@ class TestModule(pan.test.TestCase):
         ulines = pan.util.sorted_unique_lines(lines)
         ulines = [x["name"] for x in ulines]
         assert ulines == ["10", "102", "102T", "103"]
+
+    def test_write_json(self):
+        handle, path = tempfile.mkstemp()
+        pan.util.write_json(dict(a=[1, 2]), path)
+        assert pan.util.read_json(path) == dict(a=[1, 2])
+        os.remove(path)
+
+    def test_write_json__compact(self):
+        handle, path = tempfile.mkstemp()
+        pan.util.write_json(dict(a=[1, 2]), path, compact=True)
+        assert open(path, "r").read() == '{"a":[1,2]}'
+        os.remove(path)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pan.test
+import threading
+import time
+
+
+class TestWorkerPool(pan.test.TestCase):
+
+    def setup_method(self, method):
+        self.pool = pan.workers.WorkerPool(1)
+
+    def teardown_method(self, method):
+        self.pool.terminate()
+
+    def test_is_alive(self):
+        assert self.pool.is_alive()
+        self.pool.terminate()
+        assert not self.pool.is_alive()
+
+    def test_put(self):
+        done = threading.Event()
+        self.pool.put(done.set)
+        assert done.wait(3)
+
+    def test_put__priority(self):
+        called = []
+        block = threading.Event()
+        self.pool.put(block.wait, 3)
+        self.pool.put(called.append, 2, priority=1)
+        self.pool.put(called.append, 1, priority=0)
+        block.set()
+        time.sleep(0.5)
+        assert called == [1, 2]
+
+    def test_terminate(self):
+        called = []
+        block = threading.Event()
+        self.pool.put(block.wait, 3)
+        self.pool.put(called.append, 1)
+        self.pool.terminate()
+        block.set()
+        time.sleep(0.5)
+        assert not called
+        self.pool.put(called.append, 2)
+        time.sleep(0.5)
+        assert not called
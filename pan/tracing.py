@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tracing time spent in nested spans of calls.
+
+Enable by setting the environment variable ``PAN_TRANSIT_TRACE`` to
+a non-blank value or calling :func:`start`. Spans are written as Chrome
+trace JSON, which can be viewed at ``chrome://tracing`` or with Perfetto.
+"""
+
+import collections
+import functools
+import itertools
+import os
+import pan
+import threading
+import time
+
+ENABLED = bool(os.getenv("PAN_TRANSIT_TRACE", "").strip())
+
+# Bound memory use if tracing is left on for long.
+MAX_EVENTS = 100000
+
+_counter = itertools.count(1)
+_events = collections.deque(maxlen=MAX_EVENTS)
+_local = threading.local()
+_threads = {}
+
+
+class NullSpan:
+
+    """A context manager that does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        """Return span unchanged."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Return without recording anything."""
+        pass
+
+_null = NullSpan()
+
+
+class Span:
+
+    """A context manager for tracing time spent in a call."""
+
+    __slots__ = ("args", "category", "id", "name", "start")
+
+    def __init__(self, name, category, args):
+        """Initialize a :class:`Span` instance."""
+        self.args = args
+        self.category = category
+        self.id = next(_counter)
+        self.name = name
+
+    def __enter__(self):
+        """Start span as a child of the current span."""
+        stack = _get_stack()
+        self.args["id"] = self.id
+        self.args["parent"] = stack[-1].id if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        """End span and add it to traced events."""
+        duration = time.perf_counter() - self.start
+        _get_stack().pop()
+        thread = threading.current_thread()
+        _threads[thread.ident] = thread.name
+        _events.append(dict(args=self.args,
+                            cat=self.category,
+                            dur=int(duration * 1000000),
+                            name=self.name,
+                            ph="X",
+                            pid=os.getpid(),
+                            tid=thread.ident,
+                            ts=int(self.start * 1000000)))
+
+
+def _get_stack():
+    """Return the stack of open spans of the current thread."""
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def span(name, category="pan", **args):
+    """Return a context manager for tracing time spent as `name`."""
+    if not ENABLED: return _null
+    return Span(name, category, args)
+
+def start():
+    """Start tracing spans."""
+    global ENABLED
+    ENABLED = True
+
+def stop():
+    """Stop tracing spans and write traced events."""
+    global ENABLED
+    ENABLED = False
+    write()
+
+def traced(category):
+    """Decorator for tracing calls of methods as spans."""
+    def outer_wrapper(function):
+        @functools.wraps(function)
+        def inner_wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with Span(function.__qualname__, category, {}):
+                return function(*args, **kwargs)
+        return inner_wrapper
+    return outer_wrapper
+
+def write(path=None):
+    """Write traced events to Chrome trace JSON file at `path`."""
+    if not _events: return
+    path = path or os.path.join(pan.CACHE_HOME_DIR, "trace.json")
+    events = list(_events)
+    events.extend(dict(args=dict(name=name),
+                       name="thread_name",
+                       ph="M",
+                       pid=os.getpid(),
+                       tid=ident) for ident, name in _threads.items())
+
+    with pan.util.silent(Exception, tb=True):
+        pan.util.write_json(dict(displayTimeUnit="ms",
+                                 traceEvents=events), path, compact=True)
+
+    _events.clear()
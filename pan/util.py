@@ -22,6 +22,7 @@ import contextlib
 import copy
 import functools
 import glob
+import importlib.machinery
 import json
 import locale
 import math
@@ -32,13 +33,18 @@ import re
 import shutil
 import socket
 import stat
-import sys
 import time
-import traceback
+import types
 import urllib.parse
 
 from pan.i18n import _
 
+RE_LINE = re.compile(r"^([A-Z]+|[0-9]+)(.*)$")
+RE_NON_WORD = re.compile(r"\W")
+
+# Compiled code of modules loaded by load_module.
+_module_code = {}
+
 
 def api_query(fallback):
     """Decorator for API requests with graceful error handling."""
@@ -55,7 +61,7 @@ def api_query(fallback):
             except socket.timeout:
                 return dict(error=True, message=_("Connection timed out"))
             except Exception:
-                traceback.print_exc()
+                pan.log.exception("{} failed", function.__qualname__)
                 return copy.deepcopy(fallback)
         return inner_wrapper
     return outer_wrapper
@@ -102,6 +108,18 @@ def calculate_distance(x1, y1, x2, y2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return 6371000 * c
 
+def compile_ignores(ignores):
+    """
+    Return a set of normalized lines to ignore.
+
+    `ignores` should be a list of dictionaries with fields "name" and
+    "destination". The return value can be given to :func:`filter_departures`
+    and :func:`filter_lines` in place of `ignores` to avoid normalizing again.
+    """
+    if isinstance(ignores, frozenset): return ignores
+    return frozenset((x["name"].lower(), x["destination"].lower())
+                     for x in ignores or [])
+
 def departure_time_to_color(dist, departure):
     """
     Return color to use for departure based on time and distance remaining.
@@ -120,23 +138,47 @@ def departure_time_to_color(dist, departure):
     if min_left > 1 and dist / 100 <= min_left: return "#fff444"
     return "#ff4744"
 
+def departure_to_key(departure):
+    """Return a string uniquely identifying `departure`."""
+    return "{}|{}|{}".format(departure["stop"],
+                             departure["line"],
+                             departure["scheduled_time"])
+
+def diff_departures(old, new):
+    """
+    Return changes needed to turn departures `old` into `new`.
+
+    Return a dictionary with keys "inserted", "removed", "changed" and
+    "keys". Departures are identified by their "key" field, see
+    :func:`departure_to_key`. "removed" is a list of keys, "inserted" and
+    "changed" are lists of departures and "keys" is a list of keys of `new`
+    in order, by which to place departures.
+    """
+    old = {x["key"]: x for x in old}
+    keys = [x["key"] for x in new]
+    diff = dict(inserted=[], removed=[], changed=[], keys=keys)
+    present = set(keys)
+    diff["removed"] = [x for x in old if not x in present]
+    for departure in new:
+        if not departure["key"] in old:
+            diff["inserted"].append(dict(departure))
+        elif departure != old[departure["key"]]:
+            diff["changed"].append(dict(departure))
+    return diff
+
 def filter_departures(departures, ignores):
     """Return `departures` with lines to ignore dropped."""
     if not ignores: return departures
+    ignores = compile_ignores(ignores)
     return [x for x in departures if not
-            any((x["line"].lower() ==
-                 y["name"].lower() and
-                 x["destination"].lower() ==
-                 y["destination"].lower()) for y in ignores)]
+            (x["line"].lower(), x["destination"].lower()) in ignores]
 
 def filter_lines(lines, ignores):
     """Return `lines` with ones to ignore dropped."""
     if not ignores: return lines
+    ignores = compile_ignores(ignores)
     return [x for x in lines if not
-            any((x["name"].lower() ==
-                 y["name"].lower() and
-                 x["destination"].lower() ==
-                 y["destination"].lower()) for y in ignores)]
+            (x["name"].lower(), x["destination"].lower()) in ignores]
 
 def format_departure_time(departure):
     """Format Unix time `departure` for display."""
@@ -151,6 +193,25 @@ def format_departure_time(departure):
     return "{:.0f}:{:02.0f}".format(departure.tm_hour,
                                     departure.tm_min)
 
+def format_departures(departures, x, y):
+    """
+    Return display times and colors for `departures`.
+
+    `departures` should be a list of dictionaries with fields "time", "x" and
+    "y" and optionally "color". `x` and `y` should be the coordinates of the
+    user's position. Return a list of dictionaries with fields "time_qml" and
+    "color_qml" in the same order as `departures`.
+    """
+    values = []
+    for departure in departures:
+        color = departure.get("color", "")
+        if not color:
+            dist = calculate_distance(x, y, departure["x"], departure["y"])
+            color = departure_time_to_color(dist, departure["time"])
+        values.append(dict(time_qml=format_departure_time(departure["time"]),
+                           color_qml=color))
+    return values
+
 def format_distance(meters, n=2):
     """Format `meters` to `n` significant digits and unit label."""
     if pan.conf.units == "american":
@@ -232,20 +293,40 @@ def get_providers():
     providers.sort(key=lambda x: x["name"])
     return providers
 
+@functools.lru_cache(1024)
 def line_to_sort_key(line):
     """Return a key for `line` to use for sorting."""
-    line = re.sub(r"\W", "", line.upper())
+    # Keys are cached per line name, so they need to be immutable.
+    # Compare numeric parts by value and letters alphabetically,
+    # placing lines starting with a number before ones starting
+    # with a letter, e.g. 58 < 58B < 506 < A < A1 < AA < B.
+    line = RE_NON_WORD.sub("", line.upper())
     if not line:
         return line_to_sort_key("0")
-    alpha = re.match("^([A-Z]+)(.*)$", line)
-    digit = re.match("^([0-9]+)(.*)$", line)
-    if alpha is not None:
-        head, tail = alpha.group(1), alpha.group(2)
-        return head, tail.zfill(100)
-    if digit is not None:
-        head, tail = digit.group(1), digit.group(2)
-        return head.zfill(100), tail
-    raise ValueError("Bad line: {}".format(repr(line)))
+    match = RE_LINE.match(line)
+    if match is None:
+        raise ValueError("Bad line: {}".format(repr(line)))
+    head, tail = match.group(1), match.group(2)
+    if head.isdigit():
+        return 0, int(head), tail
+    # Compare tails numerically, i.e. first by length
+    # disregarding leading zeros, then alphabetically.
+    tail = tail.lstrip("0")
+    return 1, head, len(tail), tail
+
+def load_module(path):
+    """Return a new module executed from Python source file at `path`."""
+    # Compile (or read bytecode from cache) only once per file, but execute
+    # the code anew on each call to get separate modules, since e.g. region-
+    # specific Digitransit providers share code, but set different globals.
+    name = "pan_{}".format(os.path.splitext(os.path.basename(path))[0])
+    if not path in _module_code:
+        loader = importlib.machinery.SourceFileLoader(name, path)
+        _module_code[path] = loader.get_code(name)
+    module = types.ModuleType(name)
+    module.__file__ = path
+    exec(_module_code[path], module.__dict__)
+    return module
 
 def locked_method(function):
     """
@@ -267,9 +348,8 @@ def makedirs(directory):
     try:
         os.makedirs(directory)
     except OSError as error:
-        print("Failed to create directory {}: {}"
-              .format(repr(directory), str(error)),
-              file=sys.stderr)
+        pan.log.error("Failed to create directory {}: {}",
+                      repr(directory), str(error))
         raise # OSError
     return directory
 
@@ -292,9 +372,8 @@ def read_json(path):
         with open(path, "r", encoding="utf_8") as f:
             data = json.load(f)
     except Exception as error:
-        print("Failed to read file {}: {}"
-              .format(repr(path), str(error)),
-              file=sys.stderr)
+        pan.log.error("Failed to read file {}: {}",
+                      repr(path), str(error))
         raise # Exception
     # Translatable field names are prefixed with an underscore,
     # e.g. "_description". Translate the values of these fields
@@ -308,22 +387,22 @@ def read_json(path):
             data[key[1:]] = translate(data.pop(key))
     return data
 
+def records_to_dicts(items):
+    """Return `items` with records converted to dictionaries."""
+    return [x.to_dict() if isinstance(x, pan.Record) else x for x in items]
+
 @contextlib.contextmanager
 def silent(*exceptions, tb=False):
     """Try to execute body, ignoring `exceptions`."""
     try:
         yield
     except exceptions:
-        if tb: traceback.print_exc()
+        if tb: pan.log.exception("Ignored error")
 
 def sorted_by_distance(items, x, y):
     """Return `items` sorted by distance from given coordinates."""
-    for item in items:
-        item["__dist"] = calculate_distance(item["x"], item["y"], x, y)
-    items = sorted(items, key=lambda z: z["__dist"])
-    for item in items:
-        del item["__dist"]
-    return items
+    return sorted(items, key=lambda z: calculate_distance(
+        z["x"], z["y"], x, y))
 
 def sorted_departures(departures):
     """Return `departures` sorted by time and line."""
@@ -338,14 +417,15 @@ def sorted_unique_lines(lines):
     return sorted(ulines, key=lambda x: (line_to_sort_key(x["name"]),
                                          x["destination"]))
 
-def write_json(data, path):
+def write_json(data, path, compact=False):
     """Write `data` to JSON file at `path`."""
+    # Use compact output for large files not meant to be edited by hand.
+    kwargs = (dict(separators=(",", ":")) if compact else dict(indent=4))
     try:
         makedirs(os.path.dirname(path))
         with atomic_open(path, "w", encoding="utf_8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4, sort_keys=True)
+            json.dump(data, f, ensure_ascii=False, sort_keys=True, **kwargs)
     except Exception as error:
-        print("Failed to write file {}: {}"
-              .format(repr(path), str(error)),
-              file=sys.stderr)
+        pan.log.error("Failed to write file {}: {}",
+                      repr(path), str(error))
         raise # Exception
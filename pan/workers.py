@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Background tasks run by a bounded pool of threads."""
+
+import itertools
+import pan
+import queue
+import threading
+
+__all__ = ("WorkerPool",)
+
+
+class WorkerPool:
+
+    """A bounded pool of worker threads running prioritized tasks."""
+
+    def __init__(self, threads):
+        """Initialize a :class:`WorkerPool` instance."""
+        self._alive = True
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._threads = threads
+        self._workers = []
+
+    def is_alive(self):
+        """Return ``True`` if pool is in use."""
+        return self._alive
+
+    def put(self, function, *args, priority=0):
+        """
+        Queue `function` to be called with `args` in a worker thread.
+
+        Tasks with lower `priority` are run first, tasks with equal `priority`
+        in the order queued. Tasks queued after :meth:`terminate` are ignored.
+        """
+        if not self._alive: return
+        # Use a running counter to break ties, since
+        # functions and arguments can't be compared.
+        self._queue.put((priority, next(self._counter), function, args))
+        self._start_worker()
+
+    @pan.util.locked_method
+    def _start_worker(self):
+        """Start a new worker thread if below the maximum amount."""
+        if not self._alive: return
+        if len(self._workers) >= self._threads: return
+        worker = threading.Thread(target=self._work, daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    @pan.util.locked_method
+    def terminate(self):
+        """Drop queued tasks and stop worker threads."""
+        if not self._alive: return
+        # Mark as dead so that subsequent operations fail.
+        self._alive = False
+        with pan.util.silent(queue.Empty):
+            while True:
+                self._queue.get_nowait()
+        # Wake up idle workers blocking on an empty queue.
+        for worker in self._workers:
+            self._queue.put((-1, next(self._counter), None, ()))
+
+    def _work(self):
+        """Run queued tasks until terminated."""
+        while self._alive:
+            priority, i, function, args = self._queue.get()
+            if not self._alive or function is None: break
+            with pan.util.silent(Exception, tb=True):
+                function(*args)
+
+
+pool = WorkerPool(2)
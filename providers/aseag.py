@@ -63,16 +63,16 @@ def parsejson_find_departures(data):
     for line in data.splitlines():
         linelist = json.loads(line)
         if linelist[0] == 1:
-            output.append({
-                "destination": linelist[11],
-                "line": linelist[9],
-                "realtime": True,
-                "scheduled_time": int(linelist[15]/1000),
-                "stop": linelist[2],
-                "time": int(linelist[15]/1000),
-                "x": float(linelist[6]),
-                "y": float(linelist[5]),
-            })
+            output.append(pan.Departure(
+                destination=linelist[11],
+                line=linelist[9],
+                realtime=True,
+                scheduled_time=int(linelist[15]/1000),
+                stop=linelist[2],
+                time=int(linelist[15]/1000),
+                x=float(linelist[6]),
+                y=float(linelist[5]),
+            ))
     return output
 
 def find_lines(stops):
@@ -91,26 +91,41 @@ def parsejson_find_lines(data):
     for line in data.splitlines():
         linelist = json.loads(line)
         if linelist[0] == 1:
-            newdict = {
-                "color": "#bb0032",
-                "destination": linelist[11],
-                "id": linelist[9],
-                "name": linelist[9],
-            }
+            newdict = pan.Line(
+                color="#bb0032",
+                destination=linelist[11],
+                id=linelist[9],
+                name=linelist[9],
+            )
             if newdict not in output:
                 output.append(newdict)
     return output
 
+def find_nearby_departures(x, y, n):
+    """Return stops near given coordinates and departures of `n` nearest."""
+    # The same response used for stops includes their departures.
+    request = get_nearby(x, y)
+    stops = parsejson_find_nearby_stops(request)
+    nearest = pan.util.sorted_by_distance(stops, x, y)[:n]
+    nearest = set(x.id for x in nearest)
+    departures = parsejson_find_departures(request)
+    departures = [x for x in departures if x.stop in nearest]
+    return stops, pan.util.sorted_departures(departures)
+
 def find_nearby_stops(x, y):
     """Return a list of stops near given coordinates."""
+    request = get_nearby(x, y)
+    return parsejson_find_nearby_stops(request)
+
+def get_nearby(x, y):
+    """Return response of stops near given coordinates."""
     radius = 500
     params = {
         "Circle": "{:.6f},{:.6f},{:d}".format(y, x, radius),
         "ReturnList": ",".join(RETURN_LIST),
     }
     url = format_url("/instant_V2", **params)
-    request = pan.http.get(url, encoding="utf_8")
-    return parsejson_find_nearby_stops(request)
+    return pan.http.get(url, encoding="utf_8")
 
 def parsejson_find_nearby_stops(data):
     output = []
@@ -123,15 +138,15 @@ def parsejson_find_nearby_stops(data):
             one_line_summary = "{} → {}".format(linelist[9], linelist[11])
             if oldStop != linelist[2]:
                 if init == False:
-                    newdict = {
-                        "color": "#bb0032",
-                        "description": _("Stop"),
-                        "id": linelist[2],
-                        "line_summary": "\n".join(line_summary[:3]),
-                        "name": linelist[1],
-                        "x": float(linelist[6]),
-                        "y": float(linelist[5]),
-                    }
+                    newdict = pan.Stop(
+                        color="#bb0032",
+                        description=_("Stop"),
+                        id=linelist[2],
+                        line_summary="\n".join(line_summary[:3]),
+                        name=linelist[1],
+                        x=float(linelist[6]),
+                        y=float(linelist[5]),
+                    )
                     output.append(newdict)
                 line_summary = [one_line_summary]
             else:
@@ -156,15 +171,15 @@ def parsejson_find_stops(data):
     output = []
     data = data["resultList"]
     for line in data:
-        output.append({
-            "color": "#bb0032",
-            "description": _("Stop"),
-            "id": line["stopPointId"],
-            "line_summary": "",
-            "name": line["stopPointName"],
-            "x": float(line["longitude"]),
-            "y": float(line["latitude"]),
-        })
+        output.append(pan.Stop(
+            color="#bb0032",
+            description=_("Stop"),
+            id=line["stopPointId"],
+            line_summary="",
+            name=line["stopPointName"],
+            x=float(line["longitude"]),
+            y=float(line["latitude"]),
+        ))
     return output
 
 def format_url(path, **params):
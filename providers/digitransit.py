@@ -22,10 +22,15 @@ http://digitransit.fi/en/developers/services-and-apis/1-routing-api/
 http://dev.hsl.fi/graphql/console/
 """
 
-import functools
+import glob
+import hashlib
+import heapq
+import itertools
+import json
 import os
 import pan
 import re
+import time
 
 from pan.i18n import _
 
@@ -39,96 +44,170 @@ COLORS = pan.AttrDict({
      "WALK": "#888888",
 })
 
-HEADERS = {"Content-Type": "application/graphql"}
+# Maximum amount of departures to query per stop,
+# the default of numberOfDepartures in queries.
+DEPARTURES_PER_STOP = 30
+
+HEADERS = {"Content-Type": "application/json"}
+
+# Seconds to reuse patterns of stops, see find_patterns.
+PATTERN_CACHE_AGE = 3600
+
+# Failed requests with only hashes in a row after which to assume
+# that the server doesn't support persisted queries.
+MAX_PERSISTED_FAILURES = 3
+
+# Send only hashes of known queries instead of full text,
+# see post_graphql. Turned off if not supported by the server.
+PERSISTED_QUERIES = True
+
 URL = "http://api.digitransit.fi/routing/v1/routers/{region}/index/graphql"
 
 # Overriden by region-specific implementations.
 REGION = None
 
-def find_departures(stops):
+_patterns = {}
+_persisted_failures = 0
+
+def filter_patterns(patterns, ignores):
+    """Return `patterns` with lines ignored in all directions dropped."""
+    # Headsigns of patterns can differ from those of trips, which
+    # departures are filtered by, so drop only lines ignored in all
+    # directions at a stop and leave the rest to filter_departures.
+    keep = set((x[0], x[2]) for x in patterns if not x[2:] in ignores)
+    return [x for x in patterns if (x[0], x[2]) in keep]
+
+def find_departures(stops, limit=None, window=None, ignores=None):
     """Return a list of departures from `stops`."""
-    stops = ", ".join('"{}"'.format(x) for x in stops)
-    body = format_graphql("find_departures", ids=stops)
-    url = URL.format(region=REGION)
-    result = pan.http.post_json(url, body, headers=HEADERS)
-    result = pan.AttrDict(result)
-    def departures():
-        for stop in result.data.stops:
-            for departure in stop.stoptimesWithoutPatterns:
-                yield stop, departure
-    return pan.util.sorted_departures([{
-        "destination": parse_headsign(departure.trip.tripHeadsign),
-        "line": parse_line_name(departure.trip.route),
-        "realtime": bool(departure.realtime),
-        "scheduled_time": parse_scheduled_time(departure),
-        "stop": stop.gtfsId,
-        "time": parse_time(departure),
-        "x": float(stop.lon),
-        "y": float(stop.lat),
-    } for stop, departure in departures()])
+    variables = {}
+    if limit:
+        # The first departures over all stops can all be from
+        # the same stop, so we need up to limit from each stop,
+        # but never query more than without a limit.
+        variables["numberOfDepartures"] = min(int(limit),
+                                              DEPARTURES_PER_STOP)
+    if window:
+        variables["startTime"] = int(time.time())
+        variables["timeRange"] = int(window)
+    if ignores:
+        # Query only patterns not ignored, so that departures
+        # of ignored lines are not transferred or parsed at all.
+        ignores = pan.util.compile_ignores(ignores)
+        patterns = find_patterns(stops)
+        keep = filter_patterns(patterns, ignores)
+        if not keep: return []
+        if len(keep) < len(patterns):
+            # Query up to limit per pattern, but not more in total
+            # than would be queried per stop without a limit.
+            number = DEPARTURES_PER_STOP * len(stops) // len(keep)
+            variables["numberOfDepartures"] = min(
+                variables.get("numberOfDepartures", DEPARTURES_PER_STOP),
+                max(1, number))
+            name = get_pattern_query(len(keep))
+            for i, (stop, code, line, destination) in enumerate(keep):
+                variables["d{:d}Stop".format(i)] = stop
+                variables["d{:d}Pattern".format(i)] = code
+            result = post_graphql(name, **variables)
+            stops = [result.data[x] for x in result.data]
+            return parse_departures(stops,
+                                    "stopTimesForPattern",
+                                    limit,
+                                    ignores)
+
+        # Departures can still be ignored by headsign, so query
+        # as many per stop as without a limit to not run short.
+        variables.pop("numberOfDepartures", None)
+    result = post_graphql("find_departures", ids=stops, **variables)
+    return parse_departures(result.data.stops,
+                            "stoptimesWithoutPatterns",
+                            limit,
+                            ignores)
 
 def find_lines(stops):
     """Return a list of lines that use `stops`."""
-    stops = ", ".join('"{}"'.format(x) for x in stops)
-    body = format_graphql("find_lines", ids=stops)
-    url = URL.format(region=REGION)
-    result = pan.http.post_json(url, body, headers=HEADERS)
-    result = pan.AttrDict(result)
+    result = post_graphql("find_lines", ids=stops)
     def patterns():
         for stop in result.data.stops:
             for pattern in stop.patterns:
                 yield pattern
-    return pan.util.sorted_unique_lines([{
-        "color": COLORS.get(pattern.route.mode, COLORS.BUS),
-        "destination": parse_headsign(pattern.headsign),
-        "id": pattern.route.gtfsId,
-        "name": parse_line_name(pattern.route),
-    } for pattern in patterns()])
+    return pan.util.sorted_unique_lines([pan.Line(
+        color=COLORS.get(pattern.route.mode, COLORS.BUS),
+        destination=parse_headsign(pattern.headsign),
+        id=pattern.route.gtfsId,
+        name=parse_line_name(pattern.route),
+    ) for pattern in patterns()])
+
+def find_nearby_departures(x, y, n):
+    """Return stops near given coordinates and departures of `n` nearest."""
+    # Query stops and departures of the nearest stops together
+    # to avoid one request per stop when opening a nearby stop.
+    result = post_graphql("find_nearby_departures",
+                          lat=round(y, 6),
+                          lon=round(x, 6),
+                          first=int(n))
+
+    stops = parse_stops([x.node.stop for x in
+                         result.data.stops.edges])
+    departures = parse_departures([x.node.stop for x in
+                                   result.data.departures.edges],
+                                  "stoptimesWithoutPatterns")
+    return stops, departures
 
 def find_nearby_stops(x, y):
     """Return a list of stops near given coordinates."""
-    body = format_graphql("find_nearby_stops", x=x, y=y)
-    url = URL.format(region=REGION)
-    result = pan.http.post_json(url, body, headers=HEADERS)
-    result = pan.AttrDict(result)
-    return [{
-        "color": get_stop_color(stop),
-        "description": stop.desc or _("Stop"),
-        "id": stop.gtfsId,
-        "line_summary": get_line_summary(stop),
-        "name": format_stop_name(stop),
-        "x": float(stop.lon),
-        "y": float(stop.lat),
-    } for stop in [x.node.stop for x in
-                   result.data.stopsByRadius.edges]]
+    result = post_graphql("find_nearby_stops",
+                          lat=round(y, 6),
+                          lon=round(x, 6))
+    return parse_stops([x.node.stop for x in
+                        result.data.stopsByRadius.edges])
+
+def find_patterns(stops):
+    """Return a list of stop, pattern, line and destination of `stops`."""
+    # Patterns change rarely, but are needed on each refresh
+    # of departures with ignored lines, so keep for a while.
+    key = tuple(stops)
+    if key in _patterns:
+        found, patterns = _patterns[key]
+        if time.time() - found < PATTERN_CACHE_AGE:
+            return patterns
+    result = post_graphql("find_patterns", ids=stops)
+    patterns = [(stop.gtfsId,
+                 pattern.code,
+                 parse_line_name(pattern.route).lower(),
+                 parse_headsign(pattern.headsign).lower())
+                for stop in result.data.stops
+                for pattern in stop.patterns]
+
+    _patterns[key] = (time.time(), patterns)
+    return patterns
 
 def find_stops(query, x, y):
     """Return a list of stops matching `query`."""
-    query = re.sub('["{}]', "", query)
-    body = format_graphql("find_stops", query=query)
-    url = URL.format(region=REGION)
-    result = pan.http.post_json(url, body, headers=HEADERS)
-    result = pan.AttrDict(result)
-    return [{
-        "color": get_stop_color(stop),
-        "description": stop.desc or _("Stop"),
-        "id": stop.gtfsId,
-        "line_summary": get_line_summary(stop),
-        "name": format_stop_name(stop),
-        "x": float(stop.lon),
-        "y": float(stop.lat),
-    } for stop in result.data.stops]
-
-@functools.lru_cache(8)
-def format_graphql(name, **kwargs):
+    result = post_graphql("find_stops", query=query)
+    return parse_stops(result.data.stops)
+
+def format_graphql(name, persisted=False, full=True, **variables):
     """Return GraphQL request body for given request type."""
-    directory = os.path.abspath(os.path.dirname(__file__))
-    path = "{}/digitransit/{}.graphql".format(directory, name)
-    body = open(path, "r").read().strip()
-    # Double curly braces to not interfere with str.format.
-    body = re.sub(r"\{(\s*)$", r"{{\1", body, flags=re.MULTILINE)
-    body = re.sub(r"^(\s*)\}", r"\1}}", body, flags=re.MULTILINE)
-    return body.format(**kwargs)
+    # Pass arguments as variables so that query text is constant
+    # and requests can be made without formatting the query.
+    body = dict(variables=variables)
+    if full:
+        body["query"] = QUERIES[name]
+    if persisted:
+        body["extensions"] = dict(persistedQuery=dict(
+            sha256Hash=HASHES[name], version=1))
+    return json.dumps(body)
+
+def format_pattern_query(n):
+    """Return GraphQL query text for departures of `n` patterns."""
+    aliases = ["d{:d}".format(i) for i in range(n)]
+    template = QUERIES["pattern_departures"]
+    return (QUERIES["find_departures_by_patterns"]
+            .replace("{variables}", " ".join(
+                "${0}Stop: String! ${0}Pattern: String!".format(x)
+                for x in aliases))
+            .replace("{stops}", " ".join(
+                template.replace("{alias}", x) for x in aliases)))
 
 def format_stop_name(stop):
     """Return user visible name for `stop`."""
@@ -141,13 +220,25 @@ def format_stop_name(stop):
 
 def get_line_summary(stop):
     """Return a summary of lines that use `stop`."""
-    lines = pan.util.sorted_unique_lines([pan.AttrDict({
-        "name": parse_line_name(pattern.route),
-        "destination": parse_headsign(pattern.headsign),
-    }) for pattern in stop.patterns])
+    lines = pan.util.sorted_unique_lines([pan.Line(
+        name=parse_line_name(pattern.route),
+        destination=parse_headsign(pattern.headsign),
+    ) for pattern in stop.patterns])
     return "\n".join("{} → {}".format(x.name, x.destination)
                      for x in lines[:3])
 
+def get_pattern_query(n):
+    """Return name of query for departures of `n` patterns."""
+    # Stops and patterns are given as variables, so the query
+    # text depends only on the amount of patterns. Add queries
+    # as needed, at most one per amount of stops.
+    name = "find_departures_by_{:d}_patterns".format(n)
+    if name in QUERIES: return name
+    text = format_pattern_query(n)
+    QUERIES[name] = text
+    HASHES[name] = hashlib.sha256(text.encode("utf_8")).hexdigest()
+    return name
+
 def get_stop_color(stop):
     """Return color to use for `stop` based on modes."""
     modes = [x.route.mode for x in stop.patterns]
@@ -156,6 +247,33 @@ def get_stop_color(stop):
     if not order: return COLORS.BUS
     return COLORS.get(order[0], COLORS.BUS)
 
+def parse_departures(stops, field, limit=None, ignores=None):
+    """Return a list of departures from `field` of `stops`."""
+    def stop_departures(i, stop):
+        # Decorate with indices to never compare the records themselves,
+        # since heapq.merge has no key argument before Python 3.5.
+        return sorted((parse_time(x), i, j, stop, x)
+                      for j, x in enumerate(stop[field]))
+    # Merge departures of stops in order of time and only
+    # create records for the first limit of those not ignored.
+    departures = (pan.Departure(
+        destination=parse_headsign(departure.trip.tripHeadsign),
+        line=parse_line_name(departure.trip.route),
+        realtime=bool(departure.realtime),
+        scheduled_time=parse_scheduled_time(departure),
+        stop=stop.gtfsId,
+        time=parse_time(departure),
+        x=float(stop.lon),
+        y=float(stop.lat),
+    ) for _, _, _, stop, departure in heapq.merge(
+        *itertools.starmap(stop_departures, enumerate(stops))))
+    if ignores:
+        departures = (x for x in departures if not
+                      (x.line.lower(), x.destination.lower()) in ignores)
+    if limit:
+        departures = itertools.islice(departures, limit)
+    return pan.util.sorted_departures(departures)
+
 def parse_headsign(headsign):
     """Return shortened headsign for display."""
     return re.sub(r"(?<! )\(", " (",
@@ -171,7 +289,74 @@ def parse_scheduled_time(departure):
     return (int(departure.serviceDay) +
             int(departure.scheduledDeparture))
 
+def parse_stops(stops):
+    """Return a list of stop records from `stops`."""
+    return [pan.Stop(
+        color=get_stop_color(stop),
+        description=stop.desc or _("Stop"),
+        id=stop.gtfsId,
+        line_summary=get_line_summary(stop),
+        name=format_stop_name(stop),
+        x=float(stop.lon),
+        y=float(stop.lat),
+    ) for stop in stops]
+
 def parse_time(departure):
     """Return Unix time in seconds for `departure`."""
     return (int(departure.serviceDay) +
             int(departure.realtimeDeparture))
+
+def post_graphql(name, **variables):
+    """Return result of GraphQL request `name` with `variables`."""
+    global PERSISTED_QUERIES, _persisted_failures
+    url = URL.format(region=REGION)
+    if PERSISTED_QUERIES:
+        # Try first with only the hash of the query, which works if the
+        # server has seen the query before. If not, send the full text
+        # too, which lets the server store it under the hash.
+        # https://www.apollographql.com/docs/apollo-server/performance/apq
+        body = format_graphql(name, persisted=True, full=False, **variables)
+        failed = False
+        try:
+            result = pan.http.post_json(url, body, headers=HEADERS)
+            errors = [x.get("message") for x in result.get("errors", [])]
+            if "PersistedQueryNotSupported" in errors:
+                PERSISTED_QUERIES = False
+            elif "data" in result:
+                _persisted_failures = 0
+                return pan.AttrView(result)
+            elif not "PersistedQueryNotFound" in errors:
+                # Other errors, e.g. about the hash, can mean that
+                # the server doesn't support persisted queries.
+                failed = True
+            # Either way, fall back on sending the full text.
+        except OSError:
+            # Connection errors, e.g. timeouts.
+            raise # OSError
+        except Exception:
+            # Servers not supporting persisted queries can fail on
+            # a request without query text.
+            failed = True
+        if failed:
+            # Any request can fail now and then, so turn persisted
+            # queries off only after several failures in a row.
+            _persisted_failures += 1
+            if _persisted_failures >= MAX_PERSISTED_FAILURES:
+                PERSISTED_QUERIES = False
+    body = format_graphql(name, persisted=PERSISTED_QUERIES, **variables)
+    result = pan.http.post_json(url, body, headers=HEADERS)
+    return pan.AttrView(result)
+
+def read_queries():
+    """Return a dictionary of GraphQL queries by request type."""
+    directory = os.path.abspath(os.path.dirname(__file__))
+    pattern = os.path.join(directory, "digitransit", "*.graphql")
+    # Drop indentation to save on bytes sent.
+    return {os.path.splitext(os.path.basename(path))[0]:
+            re.sub(r"\s+", " ", open(path, "r").read()).strip()
+            for path in glob.glob(pattern)}
+
+# Read once at import instead of on each request.
+QUERIES = read_queries()
+HASHES = {name: hashlib.sha256(text.encode("utf_8")).hexdigest()
+          for name, text in QUERIES.items()}
@@ -15,16 +15,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import importlib.machinery
 import os
-import random
+import pan
 
-name = "digitransit{:d}".format(random.randrange(10**12))
 path = os.path.join(os.path.dirname(__file__), "digitransit.py")
-loader = importlib.machinery.SourceFileLoader(name, path)
-digitransit = loader.load_module(name)
+digitransit = pan.util.load_module(path)
 digitransit.REGION = "finland"
 find_departures = digitransit.find_departures
 find_lines = digitransit.find_lines
+find_nearby_departures = digitransit.find_nearby_departures
 find_nearby_stops = digitransit.find_nearby_stops
 find_stops = digitransit.find_stops
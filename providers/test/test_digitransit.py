@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 Osmo Salomaa
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import http.server
+import itertools
+import json
+import os
+import pan.test
+import socketserver
+import threading
+import time
+
+
+class PersistedQueryServer(socketserver.ThreadingMixIn,
+                           http.server.HTTPServer):
+
+    """A stand-in GraphQL server supporting persisted queries."""
+
+    daemon_threads = True
+
+    def __init__(self, supported=True, message=None):
+        """Initialize a :class:`PersistedQueryServer` instance."""
+        self.bodies = []
+        self.failures = 0
+        self.headsigns = ["Kamppi"]
+        self.message = message
+        self.queries = {}
+        self.supported = supported
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                body = json.loads(self.rfile.read(length).decode("utf_8"))
+                self.server.bodies.append(body)
+                status, result = self.server.respond(body)
+                blob = json.dumps(result).encode("utf_8")
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(blob)))
+                self.end_headers()
+                self.wfile.write(blob)
+            def log_message(self, *args): pass
+        http.server.HTTPServer.__init__(
+            self, ("127.0.0.1", 0), Handler)
+
+    def respond(self, body):
+        """Return status and result for request `body`."""
+        if self.failures > 0:
+            self.failures -= 1
+            return 500, dict(errors=[dict(message="Internal error")])
+        extensions = body.get("extensions", {})
+        persisted = extensions.get("persistedQuery")
+        if persisted and self.supported:
+            key = persisted["sha256Hash"]
+            if "query" in body:
+                text = body["query"].encode("utf_8")
+                assert hashlib.sha256(text).hexdigest() == key
+                self.queries[key] = body["query"]
+            if not key in self.queries:
+                error = dict(message="PersistedQueryNotFound")
+                return 200, dict(errors=[error])
+        elif not "query" in body and self.message:
+            return 200, dict(errors=[dict(message=self.message)])
+        elif not "query" in body:
+            return 400, dict(errors=[dict(message="Query missing")])
+        text = body.get("query") or self.queries[persisted["sha256Hash"]]
+        variables = body.get("variables", {})
+        return 200, dict(data=self.respond_data(text, variables))
+
+    def respond_data(self, text, variables):
+        """Return data for GraphQL query `text` with `variables`."""
+        def departures(headsign, start=0):
+            return [dict(realtime=False,
+                         realtimeDeparture=60 * i,
+                         scheduledDeparture=60 * i,
+                         serviceDay=int(time.time()),
+                         trip=dict(route=dict(mode="BUS", shortName="1"),
+                                   tripHeadsign=headsign))
+                    for i in range(start, start + 3)]
+        def stop(id):
+            return dict(code="1", desc="", gtfsId=id, lat=60.1, lon=24.9,
+                        name="Kamppi", patterns=[])
+        if text.startswith("query FindPatterns"):
+            # Line 1 in both directions from the first stop,
+            # line 2 in one direction from all stops.
+            stops = [stop(x) for x in variables["ids"]]
+            for i, x in enumerate(stops):
+                x["patterns"] = [dict(
+                    code="HSL:1002:0:01", headsign="Pasila",
+                    route=dict(mode="BUS", shortName="2"))]
+                if i > 0: continue
+                x["patterns"] += [dict(
+                    code="HSL:1001:{:d}:01".format(j), headsign=headsign,
+                    route=dict(mode="BUS", shortName="1"))
+                    for j, headsign in enumerate(("Kamppi", "Pasila"))]
+            return dict(stops=stops)
+        if text.startswith("query FindDeparturesByPatterns"):
+            data = {}
+            for i in itertools.count():
+                alias = "d{:d}".format(i)
+                if not alias + "Stop" in variables: break
+                data[alias] = stop(variables[alias + "Stop"])
+                data[alias]["stopTimesForPattern"] = departures("Kamppi")
+            return data
+        stops = [stop(x) for x in variables.get("ids", ["HSL:1"])]
+        for x in stops:
+            # Departures to each headsign in turn, first to the first.
+            x["stoptimesWithoutPatterns"] = [
+                departure for i, headsign in enumerate(self.headsigns)
+                for departure in departures(headsign, 3 * i)]
+        return dict(stops=stops)
+
+
+class TestModule(pan.test.TestCase):
+
+    def setup_method(self, method):
+        directory = os.path.dirname(os.path.dirname(__file__))
+        path = os.path.join(directory, "digitransit.py")
+        self.digitransit = pan.util.load_module(path)
+
+    def start(self, supported, message=None):
+        server = PersistedQueryServer(supported, message)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:{:d}/{{region}}".format(server.server_port)
+        self.digitransit.URL = url
+        self.digitransit.REGION = "hsl"
+        return server
+
+    def test_find_departures__ignores(self):
+        server = self.start(supported=True)
+        stops = ["HSL:1", "HSL:2", "HSL:3"]
+        ignores = [dict(name="2", destination="Pasila")]
+        departures = self.digitransit.find_departures(stops,
+                                                      ignores=ignores)
+        server.shutdown()
+        server.server_close()
+        assert len(departures) == 6
+        variables = server.bodies[-1]["variables"]
+        assert variables == dict(d0Stop="HSL:1",
+                                 d0Pattern="HSL:1001:0:01",
+                                 d1Stop="HSL:1",
+                                 d1Pattern="HSL:1001:1:01",
+                                 numberOfDepartures=30)
+
+    def test_find_departures__ignores_all(self):
+        server = self.start(supported=True)
+        ignores = [dict(name="1", destination="Kamppi"),
+                   dict(name="1", destination="Pasila"),
+                   dict(name="2", destination="Pasila")]
+        departures = self.digitransit.find_departures(["HSL:1"],
+                                                      ignores=ignores)
+        server.shutdown()
+        server.server_close()
+        assert departures == []
+
+    def test_find_departures__ignores_direction(self):
+        server = self.start(supported=True)
+        ignores = [dict(name="1", destination="Pasila")]
+        departures = self.digitransit.find_departures(["HSL:1"],
+                                                      ignores=ignores)
+        server.shutdown()
+        server.server_close()
+        # Line 1 is not ignored in all directions, so no pattern can be
+        # dropped and departures should be queried by stop.
+        assert len(departures) == 3
+        assert server.bodies[-1]["variables"] == dict(ids=["HSL:1"])
+
+    def test_find_departures__ignores_direction_limit(self):
+        server = self.start(supported=True)
+        server.headsigns = ["Pasila", "Kamppi"]
+        ignores = [dict(name="1", destination="Pasila")]
+        departures = self.digitransit.find_departures(["HSL:1"],
+                                                      limit=3,
+                                                      ignores=ignores)
+        server.shutdown()
+        server.server_close()
+        # The first departures are ignored by headsign, which must
+        # not leave too few departures after the limit.
+        assert [x.destination for x in departures] == ["Kamppi"] * 3
+        assert server.bodies[-1]["variables"] == dict(ids=["HSL:1"])
+
+    def test_find_departures__ignores_line(self):
+        server = self.start(supported=True)
+        ignores = [dict(name="2", destination="Pasila")]
+        departures = self.digitransit.find_departures(["HSL:1"],
+                                                      limit=50,
+                                                      ignores=ignores)
+        server.shutdown()
+        server.server_close()
+        # Line 2 is dropped from the only stop, so departures should
+        # be queried by pattern, up to what is queried by stop.
+        assert len(departures) == 6
+        variables = server.bodies[-1]["variables"]
+        assert variables == dict(d0Stop="HSL:1",
+                                 d0Pattern="HSL:1001:0:01",
+                                 d1Stop="HSL:1",
+                                 d1Pattern="HSL:1001:1:01",
+                                 numberOfDepartures=15)
+
+    def test_find_departures__limit(self):
+        server = self.start(supported=True)
+        departures = self.digitransit.find_departures(["HSL:1"], limit=2)
+        server.shutdown()
+        server.server_close()
+        assert len(departures) == 2
+        assert server.bodies[-1]["variables"]["numberOfDepartures"] == 2
+
+    def test_find_departures__limit_default(self):
+        server = self.start(supported=True)
+        self.digitransit.find_departures(["HSL:1"], limit=50)
+        self.digitransit.find_departures(["HSL:1", "HSL:2"], limit=50)
+        server.shutdown()
+        server.server_close()
+        one = server.bodies[0]["variables"]
+        several = server.bodies[-1]["variables"]
+        assert one["numberOfDepartures"] == 30
+        assert several["numberOfDepartures"] == 30
+        assert several["ids"] == ["HSL:1", "HSL:2"]
+
+    def test_post_graphql(self):
+        server = self.start(supported=True)
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        server.shutdown()
+        server.server_close()
+        first, second, third = server.bodies
+        assert not "query" in first
+        assert "query" in second
+        assert not "query" in third
+        assert third["variables"] == dict(query="kamppi")
+
+    def test_post_graphql__error(self):
+        server = self.start(supported=False, message="Hash not allowed")
+        n = self.digitransit.MAX_PERSISTED_FAILURES
+        for i in range(n):
+            assert self.digitransit.PERSISTED_QUERIES
+            assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        assert not self.digitransit.PERSISTED_QUERIES
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        server.shutdown()
+        server.server_close()
+        assert not "query" in server.bodies[0]
+        assert "query" in server.bodies[1]
+        assert len(server.bodies) == 2 * n + 1
+        assert "query" in server.bodies[-1]
+
+    def test_post_graphql__failing(self):
+        server = self.start(supported=False)
+        n = self.digitransit.MAX_PERSISTED_FAILURES
+        for i in range(n):
+            assert self.digitransit.PERSISTED_QUERIES
+            assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        server.shutdown()
+        server.server_close()
+        assert len(server.bodies) == 2 * n + 1
+        assert "query" in server.bodies[-1]
+        assert not self.digitransit.PERSISTED_QUERIES
+
+    def test_post_graphql__not_found(self):
+        server = self.start(supported=True)
+        n = self.digitransit.MAX_PERSISTED_FAILURES
+        for i in range(n):
+            # Make the server forget the query, as after a restart.
+            server.queries.clear()
+            assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        server.shutdown()
+        server.server_close()
+        assert len(server.bodies) == 2 * n
+        assert self.digitransit.PERSISTED_QUERIES
+        assert self.digitransit._persisted_failures == 0
+
+    def test_post_graphql__transient(self):
+        server = self.start(supported=True)
+        server.failures = 1
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        server.shutdown()
+        server.server_close()
+        first, second = server.bodies
+        assert not "query" in first
+        assert "query" in second
+        assert self.digitransit.PERSISTED_QUERIES
+
+    def test_post_graphql__unsupported(self):
+        server = self.start(supported=False,
+                            message="PersistedQueryNotSupported")
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        assert self.digitransit.find_stops("kamppi", 24.9, 60.1)
+        server.shutdown()
+        server.server_close()
+        first, second, third = server.bodies
+        assert not "query" in first
+        assert "query" in second
+        assert "query" in third
+        assert not self.digitransit.PERSISTED_QUERIES
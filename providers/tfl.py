@@ -90,17 +90,17 @@ def find_departures(stops):
             find_departures(stops[1:]))
     url = format_url("/StopPoint/{}/Arrivals".format(stops[0]))
     result = pan.http.get_json(url)
-    result = list(map(pan.AttrDict, result))
-    return pan.util.sorted_departures([{
-        "destination": parse_destination(
+    result = pan.AttrView(result)
+    return pan.util.sorted_departures([pan.Departure(
+        destination=parse_destination(
             departure.get("destinationName", "") or
             departure.get("towards", "")),
-        "line": departure.lineName,
-        "realtime": False,
-        "scheduled_time": parse_time(departure.expectedArrival),
-        "stop": stops[0],
-        "time": parse_time(departure.expectedArrival),
-    } for departure in result])
+        line=departure.lineName,
+        realtime=False,
+        scheduled_time=parse_time(departure.expectedArrival),
+        stop=stops[0],
+        time=parse_time(departure.expectedArrival),
+    ) for departure in result])
 
 def find_lines(stops):
     """Return a list of lines that use `stops`."""
@@ -110,13 +110,40 @@ def find_lines(stops):
             find_lines(stops[1:]))
     url = format_url("/StopPoint/{}/Route".format(stops[0]))
     result = pan.http.get_json(url)
-    result = list(map(pan.AttrDict, result))
-    return pan.util.sorted_unique_lines([{
-        "color": COLORS.get(line.mode, COLORS.bus),
-        "destination": parse_destination(line.destinationName),
-        "id": line.naptanId,
-        "name": line.lineId,
-    } for line in result])
+    result = pan.AttrView(result)
+    return pan.util.sorted_unique_lines([pan.Line(
+        color=COLORS.get(line.mode, COLORS.bus),
+        destination=parse_destination(line.destinationName),
+        id=line.naptanId,
+        name=line.lineId,
+    ) for line in result])
+
+def find_nearby_departures(x, y, n):
+    """Return stops near given coordinates and departures of `n` nearest."""
+    stops = find_nearby_stops(x, y)
+    nearest = pan.util.sorted_by_distance(stops, x, y)[:n]
+    if not nearest: return stops, []
+    departures = []
+    # Departures are only used to prime find_departures,
+    # so failing to get them must not lose the stops.
+    with pan.util.silent(Exception, tb=True):
+        # Arrivals can be requested for a comma-separated list of stops,
+        # which saves one request per stop compared to find_departures.
+        ids = ",".join(urllib.parse.quote(x.id) for x in nearest)
+        url = format_url("/StopPoint/{}/Arrivals".format(ids))
+        result = pan.http.get_json(url)
+        result = pan.AttrView(result)
+        departures = pan.util.sorted_departures([pan.Departure(
+            destination=parse_destination(
+                departure.get("destinationName", "") or
+                departure.get("towards", "")),
+            line=departure.lineName,
+            realtime=False,
+            scheduled_time=parse_time(departure.expectedArrival),
+            stop=departure.naptanId,
+            time=parse_time(departure.expectedArrival),
+        ) for departure in result])
+    return stops, departures
 
 def find_nearby_stops(x, y):
     """Return a list of stops near given coordinates."""
@@ -133,16 +160,16 @@ def find_nearby_stops(x, y):
 
     url = format_url("/StopPoint", **params)
     result = pan.http.get_json(url)
-    result = pan.AttrDict(result)
-    return [{
-        "color": get_stop_color(stop.modes),
-        "description": get_stop_description(stop),
-        "id": stop.id,
-        "line_summary": get_line_summary(stop),
-        "name": stop.commonName,
-        "x": float(stop.lon),
-        "y": float(stop.lat),
-    } for stop in result.stopPoints]
+    result = pan.AttrView(result)
+    return [pan.Stop(
+        color=get_stop_color(stop.modes),
+        description=get_stop_description(stop),
+        id=stop.id,
+        line_summary=get_line_summary(stop),
+        name=stop.commonName,
+        x=float(stop.lon),
+        y=float(stop.lat),
+    ) for stop in result.stopPoints]
 
 def find_stops(query, x, y):
     """Return a list of stops matching `query`."""
@@ -152,16 +179,16 @@ def find_stops(query, x, y):
     path = "/StopPoint/Search/{}".format(query)
     url = format_url(path, maxResults="50", includeHubs="false")
     result = pan.http.get_json(url)
-    result = pan.AttrDict(result)
-    return [{
-        "color": get_stop_color(match.modes),
-        "description": get_stop_description(match),
-        "id": match.id,
-        "line_summary": "",
-        "name": match.name,
-        "x": float(match.lon),
-        "y": float(match.lat),
-    } for match in result.matches]
+    result = pan.AttrView(result)
+    return [pan.Stop(
+        color=get_stop_color(match.modes),
+        description=get_stop_description(match),
+        id=match.id,
+        line_summary="",
+        name=match.name,
+        x=float(match.lon),
+        y=float(match.lat),
+    ) for match in result.matches]
 
 def format_url(path, **params):
     """Return API URL for `path` with `params`."""
@@ -172,7 +199,7 @@ def format_url(path, **params):
 
 def get_line_summary(stop):
     """Return a list of lines that use `stop`."""
-    line = lambda x: pan.AttrDict(name=x.name, destination="")
+    line = lambda x: pan.Line(name=x.name, destination="")
     lines = pan.util.sorted_unique_lines(map(line, stop.lines))
     return ", ".join(x.name for x in lines[:10])
 
@@ -17,7 +17,6 @@
  */
 
 import QtQuick 2.0
-import QtPositioning 5.2
 import Sailfish.Silica 1.0
 import "."
 
@@ -36,6 +35,8 @@ Page {
     property var    results: {}
     property var    stops: []
     property string title: ""
+    // Identifies page to Python for diffs of departures.
+    property string token: Math.random().toString(36).slice(2)
 
     // Column widths to be set based on data.
     property int lineWidth: 0
@@ -119,10 +120,16 @@ Page {
         var key = page.props.key;
         page.ignores = py.call_sync("pan.app.favorites.get_ignore_lines", [page.props.key]);
         page.stops = py.call_sync("pan.app.favorites.get_stop_ids", [page.props.key]);
-        py.call("pan.app.favorites.find_departures", [key], function(results) {
+        py.call("pan.app.favorites.find_departures", [key, silent, page.token], function(results) {
             if (results && results.error && results.message) {
                 silent || (page.title = "");
                 silent || (busy.error = results.message);
+            } else if (results && results.inserted) {
+                // Patch existing list with changes since last download.
+                Util.addProperties(results.inserted, "color_qml", "")
+                Util.addProperties(results.inserted, "time_qml", "")
+                Util.patchDepartures(view.model, results);
+                view.model.count > 0 && (page.title = page.props.name);
             } else if (results && results.length > 0) {
                 view.model.clear();
                 page.lineWidth = 0;
@@ -161,13 +168,21 @@ Page {
 
     function updateTimes() {
         // Update colors and times remaining to departure.
+        var departures = [];
+        for (var i = 0; i < view.model.count; i++) {
+            var item = view.model.get(i);
+            departures.push({"color": item.color || "",
+                             "time": item.time,
+                             "x": item.x,
+                             "y": item.y});
+        }
+        var x = gps.position.coordinate.longitude;
+        var y = gps.position.coordinate.latitude;
+        var values = py.call_sync("pan.util.format_departures", [departures, x, y]);
         for (var i = view.model.count - 1; i > -1; i--) {
             var item = view.model.get(i);
-            var dist = gps.position.coordinate.distanceTo(
-                QtPositioning.coordinate(item.y, item.x));
-            item.time_qml = py.call_sync("pan.util.format_departure_time", [item.time]);
-            item.color_qml = item.color || py.call_sync(
-                "pan.util.departure_time_to_color", [dist, item.time]);
+            item.time_qml = values[i].time_qml;
+            item.color_qml = values[i].color_qml;
             // Remove departures already passed.
             item.time_qml || view.model.remove(i);
         }
@@ -84,7 +84,7 @@ Page {
         view.model.clear();
         var x = gps.position.coordinate.longitude || 0;
         var y = gps.position.coordinate.latitude || 0;
-        py.call("pan.app.provider.find_nearby_stops", [x, y], function(results) {
+        py.call("pan.app.provider.find_nearby_departures", [x, y], function(results) {
             if (results && results.error && results.message) {
                 page.title = "";
                 busy.error = results.message;
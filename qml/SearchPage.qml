@@ -27,8 +27,6 @@ Page {
     allowedOrientations: app.defaultAllowedOrientations
     canNavigateForward: app.searchQuery.length > 0
 
-    property var history: []
-
     SilicaListView {
         id: view
         anchors.fill: parent
@@ -54,8 +52,6 @@ Page {
                     text: app.tr("Remove")
                     onClicked: {
                         py.call_sync("pan.app.history.remove", [model.name]);
-                        var index = page.history.indexOf(model.name);
-                        index > -1 && page.history.splice(index, 1);
                         view.model.setProperty(model.index, "visible", false);
                     }
                 }
@@ -111,7 +107,7 @@ Page {
 
     onStatusChanged: {
         if (page.status === PageStatus.Activating) {
-            page.loadHistory();
+            page.preallocate();
             page.filterHistory();
         }
     }
@@ -119,15 +115,17 @@ Page {
     function filterHistory() {
         // Filter search history for the current search field text.
         var query = view.searchField.text;
-        var found = Util.findMatches(query, page.history, view.model.count);
+        var found = py.call_sync("pan.app.history.suggest", [query, view.model.count]);
+        found = Util.highlightMatches(query, found);
         Util.injectMatches(view.model, found, "name", "text");
         viewPlaceholder.enabled = found.length === 0;
     }
 
-    function loadHistory() {
-        // Load search history and preallocate list items.
-        page.history = py.evaluate("pan.app.history.queries");
-        while (view.model.count < 50)
+    function preallocate() {
+        // Preallocate list items for search history matches,
+        // as many as fit on the screen in either orientation.
+        var n = Math.ceil(Math.max(Screen.width, Screen.height) / Theme.itemSizeSmall);
+        while (view.model.count < n)
             view.model.append({"name": "",
                                "text": "",
                                "visible": false});
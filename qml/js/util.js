@@ -28,30 +28,23 @@ function appendAll(model, items) {
         model.append(items[i]);
 }
 
-function findMatches(query, candidates, max) {
-    // Return an array of matches from among candidates.
-    query = query.toLowerCase();
-    var found = [];
-    for (var i = 0; i < candidates.length; i++) {
-        // Match at the start of candidate strings.
-        var candidate = candidates[i].toLowerCase();
-        if (query && candidate.indexOf(query) === 0)
-            found.push(candidates[i]);
-    }
-    for (var i = 0; i < candidates.length; i++) {
-        // Match later in the candidate strings.
-        var candidate = candidates[i].toLowerCase();
-        if (query.length === 0 || candidate.indexOf(query) > 0)
-            found.push(candidates[i]);
-    }
-    found = found.slice(0, max);
+function findIndex(model, name, value) {
+    // Return index of the first item in model with name equal to value.
+    for (var i = 0; i < model.count; i++)
+        if (model.get(i)[name] === value) return i;
+    return -1;
+}
+
+function highlightMatches(query, found) {
+    // Return an array of matches with matching portion highlighted.
+    var items = [];
     for (var i = 0; i < found.length; i++) {
         // Highlight matching portion in markup field.
-        found[i] = {"text": found[i]};
-        found[i].markup = Theme.highlightText(
-            found[i].text, query, Theme.highlightColor);
+        items.push({"text": found[i]});
+        items[i].markup = Theme.highlightText(
+            found[i], query, Theme.highlightColor);
     }
-    return found;
+    return items;
 }
 
 function injectMatches(model, found, text, markup) {
@@ -65,3 +58,46 @@ function injectMatches(model, found, text, markup) {
     for (var i = found.length; i < model.count; i++)
         model.setProperty(i, "visible", false);
 }
+
+function patchDepartures(model, diff) {
+    // Apply departure changes from Python in-place to model.
+    // Place items by key, not position, since the model can lack
+    // departures already removed as passed.
+    var items = {}, wanted = {}, present = {}, current = [];
+    diff.inserted.concat(diff.changed).forEach(function(item) {
+        items[item.key] = item;
+    });
+    diff.keys.forEach(function(key) { wanted[key] = true; });
+    // Read keys of the model once and keep in sync below
+    // to avoid repeated slow lookups of model items.
+    for (var i = 0; i < model.count; i++)
+        current.push(model.get(i).key);
+    for (var i = current.length - 1; i > -1; i--) {
+        if (wanted[current[i]]) {
+            present[current[i]] = true;
+        } else {
+            model.remove(i);
+            current.splice(i, 1);
+        }
+    }
+    for (var i = 0, position = 0; i < diff.keys.length; i++) {
+        // Process in order of keys so that items before
+        // the current one are already in their final places.
+        var key = diff.keys[i];
+        var item = items[key];
+        if (!present[key] && !item) continue;
+        if (!present[key]) {
+            model.insert(position, item);
+            current.splice(position, 0, key);
+        } else {
+            var index = current.indexOf(key, position);
+            item && model.set(index, item);
+            if (index !== position) {
+                model.move(index, position, 1);
+                current.splice(index, 1);
+                current.splice(position, 0, key);
+            }
+        }
+        position++;
+    }
+}